@@ -1,20 +1,32 @@
 import asyncio
+import typing
+from concurrent.futures import Future
+from contextlib import ExitStack, aclosing
 from pathlib import Path
 
 from textual import work
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal
+from textual.message import Message
 from textual.widgets import Footer, Header, ProgressBar
 
+from npmnuke.cache import ScanFrontier, ScanIndex, SizeCache
 from npmnuke.files import (
     NODE_MODULES,
-    calculate_size,
-    find_node_modules_dirs,
+    ascan_node_modules_dirs,
     remove_node_modules,
+    scan_kwargs,
 )
 from npmnuke.logger import log
-from npmnuke.models import DialogSettings, NodeFolder
-from npmnuke.widgets import NodeResultsList, Timer
+from npmnuke.models import DialogSettings, NodeFolder, RemoveProgress
+from npmnuke.pool import PRIORITY_VISIBLE, SizePool
+from npmnuke.remove import ProgressTotal
+from npmnuke.tombstone import Reaper
+from npmnuke.top import TopFolders
+from npmnuke.widgets import AnimationClock, NodeResultsList, Timer
+
+# found folders waiting for the list, the scan pauses while it is full
+RESULT_QUEUE_SIZE = 1024
 
 
 class NPMNuke(App):
@@ -37,29 +49,82 @@ class NPMNuke(App):
     }
     """
 
+    class SizeCalculated(Message):
+        """
+        Posted when the size or the estimated size of a folder is known.
+        """
+
+        def __init__(
+            self, node_folder: NodeFolder, size: float, approximate: bool
+        ) -> None:
+            super().__init__()
+            self.node_folder = node_folder
+            self.size = size
+            self.approximate = approximate
+
     def __init__(self, settings: DialogSettings, **kwargs):
         super().__init__(**kwargs)
-        self._result_queue: asyncio.Queue[Path] = asyncio.Queue()
-        self._result_size_queue: asyncio.Queue[tuple[Path, float]] = asyncio.Queue()
+        # bounded so a fast scan waits for the list instead of piling up
+        # results, with --top only _add_top fills it and never waits
+        self._result_queue: asyncio.Queue[NodeFolder] = asyncio.Queue(
+            maxsize=0 if settings.top else RESULT_QUEUE_SIZE
+        )
+        self._result_size_queue: asyncio.Queue[
+            tuple[Path, float, bool]
+        ] = asyncio.Queue()
         self._removed_queue: asyncio.Queue[NodeFolder] = asyncio.Queue()
+        # bytes removed so far of the folders that are being removed
+        self._removing_queue: asyncio.Queue[tuple[Path, int]] = asyncio.Queue()
+
+        self._size_cache = SizeCache.load() if settings.size_cache else None
+        self._size_pool = SizePool(
+            jobs=settings.size_jobs,
+            cache=self._size_cache,
+            disk_usage=settings.disk_usage,
+            size_order=settings.size_order,
+        )
+
+        self._removing: typing.Set[Path] = set()
+        self._reaper = Reaper(jobs=settings.remove_jobs)
+        # exited when the app unmounts
+        self._exit_stack = ExitStack()
 
-        self._calculate_size_queue: asyncio.Queue[Path] = asyncio.Queue()
+        # with --top folders are only listed once they are sized
+        self._top = TopFolders(settings.top) if settings.top else None
+
+        # one interval for the spinners and the timer
+        self._clock = AnimationClock(fps=settings.fps)
 
         self._settings = settings
 
     async def on_mount(self) -> None:
+        self._exit_stack.enter_context(self._reaper)
+
+        self._clock.attach(self)
+
         await self._start_tasks()
 
+    def on_unmount(self) -> None:
+        self._size_pool.shutdown(wait=False)
+
+        self._exit_stack.close()
+
+        if self._size_cache is not None:
+            self._size_cache.save()
+
     async def _start_tasks(self) -> None:
         log.debug("START ALL TASKS")
 
-        self.run_worker(self._load_node_modules(), thread=True, exclusive=True)
+        self.run_worker(self._load_node_modules(), exclusive=True)
         self.run_worker(self._node_results.start_consumer(self._result_queue))
         if not self._settings.skip_calculating_size:
             self.run_worker(
                 self._node_results.start_size_consumer(self._result_size_queue)
             )
         self.run_worker(self._node_results.start_removed_consumer(self._removed_queue))
+        self.run_worker(
+            self._node_results.start_removing_consumer(self._removing_queue)
+        )
 
         log.debug("TASKS CREATED")
 
@@ -68,69 +133,179 @@ class NPMNuke(App):
 
         self._timer.start()
 
-        for path in find_node_modules_dirs(
-            self._settings.target_dir,
-            ignore_dot=self._settings.ignore_dot,
-            ignore_set=self._settings.ignore_set,
-        ):
-            await self._result_queue.put(path)
+        size_during_scan = (
+            self._settings.size_during_scan and not self._settings.skip_calculating_size
+        )
 
-            if not self._settings.skip_calculating_size:
-                self._calculate_size(path)
+        index = None
+        if self._settings.incremental:
+            index = await asyncio.to_thread(ScanIndex.load, self._settings.target_dir)
+
+        frontier = (
+            ScanFrontier.load(self._settings.target_dir, resume=self._settings.resume)
+            if self._settings.time_budget is not None or self._settings.resume
+            else None
+        )
+
+        # the scan runs on a thread, the results arrive on the loop. Closed
+        # right away when the app quits, which stops the scan
+        async with aclosing(
+            ascan_node_modules_dirs(
+                self._settings.target_dir,
+                **scan_kwargs(
+                    self._settings,
+                    index=index,
+                    size_cache=self._size_cache,
+                    frontier=frontier,
+                ),
+            )
+        ) as node_folders:
+            async for node_folder in node_folders:
+                if self._top is None:
+                    # waits while the list is behind, which pauses the scan
+                    await self._result_queue.put(node_folder)
+                elif size_during_scan:
+                    self._add_top(node_folder)
+
+                if not self._settings.skip_calculating_size and not size_during_scan:
+                    await self._calculate_size(node_folder)
+
+        if index is not None:
+            await asyncio.to_thread(index.save)
+
+        if frontier is not None:
+            frontier.save()
 
         self._timer.stop()
         self._progress_bar.update(total=1, progress=1)
 
         log.debug("Finished loading node_modules")
 
-    @work(thread=True)
-    async def _calculate_size(self, path: Path) -> None:
-        log.debug(f"Calculating size of {path}")
+    async def _calculate_size(self, node_folder: NodeFolder) -> None:
+        path = node_folder.path
+        # looking up the size cache and counting entries reads the folder
+        future = await asyncio.to_thread(
+            self._size_pool.submit, path, members=node_folder.members
+        )
+        future.add_done_callback(
+            lambda future: self._on_size_calculated(node_folder, future)
+        )
+
+        # the list only shows folders in the top once their exact size is known
+        if self._settings.estimate_sizes and self._top is None and not future.done():
+            estimate = self._size_pool.estimate(path)
+            estimate.add_done_callback(
+                lambda estimate: self._on_size_calculated(node_folder, estimate, True)
+            )
+
+    def _on_size_calculated(
+        self, node_folder: NodeFolder, future: Future[float | None], approximate=False
+    ) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        if future.result() is None:
+            # no estimate was made
+            return
+
+        # called from a pool thread, or on the loop when the size was cached
+        self.post_message(
+            self.SizeCalculated(node_folder, future.result(), approximate)
+        )
+
+    def on_npmnuke_size_calculated(self, event: SizeCalculated) -> None:
+        if self._top is not None:
+            # not listed yet, so nothing else looks at it
+            event.node_folder.size = event.size
+            event.node_folder.size_calculated = True
 
-        size = calculate_size(path)
-        await self._result_size_queue.put((path, size))
+            self._add_top(event.node_folder)
+        else:
+            self._result_size_queue.put_nowait(
+                (event.node_folder.path, event.size, event.approximate)
+            )
+
+    def _add_top(self, node_folder: NodeFolder) -> None:
+        kept, _ = self._top.push(node_folder)
+
+        # the list drops the folders that fell out of the top by itself
+        if kept:
+            self._result_queue.put_nowait(node_folder)
 
-        log.debug(f"Finished calculating size of {path}")
+    def on_node_results_list_highlighted(
+        self, event: NodeResultsList.Highlighted
+    ) -> None:
+        """
+        Calculate the highlighted folder and the folders below it first.
+        """
+        self._size_pool.prioritize(event.node_folder.path)
+
+        index = self._node_results.index
+        visible = self._node_results.size.height
+
+        for node_folder in self._node_results.rows(index + 1, index + 1 + visible):
+            self._size_pool.prioritize(node_folder.path, PRIORITY_VISIBLE)
 
     async def action_remove_selected(self) -> None:
         log.debug("Removing selected")
 
-        item = self._node_results.highlighted_child
+        node_folder = self._node_results.highlighted
 
-        if item is None:
+        if node_folder is None:
             return
 
-        node_folder = item.node_folder
-
         if node_folder.removed or (
             not self._settings.skip_calculating_size and node_folder.size is None
         ):
             self.bell()
             return
 
+        if node_folder.path in self._removing:
+            return
+
+        self._removing.add(node_folder.path)
         self._remove_node_modules(node_folder)
 
-    @work(group="remove")
-    async def _remove_node_modules(self, node_folder: Path) -> None:
+    @work(thread=True, group="remove")
+    def _remove_node_modules(self, node_folder: NodeFolder) -> None:
         path = node_folder.path
 
+        def report(progress: RemoveProgress) -> None:
+            # shown in the row of the folder while it is removed
+            self.call_from_thread(
+                self._removing_queue.put_nowait, (path, progress.bytes)
+            )
+
         log.debug(f"Removing {path}")
 
-        if not self._settings.dry_run:
-            remove_node_modules(path)
+        if self._settings.dry_run:
+            pass
+        elif self._settings.background_remove:
+            for project in (path, *node_folder.members):
+                self._reaper.bury(project / NODE_MODULES)
+        else:
+            progress = remove_node_modules(
+                path,
+                jobs=self._settings.remove_jobs,
+                on_progress=ProgressTotal(report, interval=1 / self._settings.fps),
+                members=node_folder.members,
+            )
+            log.debug(f"Removed {progress.files} files, {progress.bytes} bytes")
 
         log.debug(f"Finished removing {path}")
 
-        await self._removed_queue.put(node_folder)
+        self.call_from_thread(self._removed_queue.put_nowait, node_folder)
 
     def compose(self) -> ComposeResult:
         """Compose our UI."""
         log.debug("COMPOSE UI")
         self._node_results = NodeResultsList(
-            skip_calculating_size=self._settings.skip_calculating_size
+            clock=self._clock,
+            skip_calculating_size=self._settings.skip_calculating_size,
+            top=self._settings.top,
         )
         self._progress_bar = ProgressBar(show_percentage=False, show_eta=False)
-        self._timer = Timer(classes="timer")
+        self._timer = Timer(self._clock, classes="timer")
         yield Header()
         yield Horizontal(
             self._progress_bar,
@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+from npmnuke.logger import log
+
+INDEX_VERSION = 3
+
+# directories modified this close to the scan can still change within the
+# same mtime tick, so they are not trusted on the next run
+RACY_MTIME_WINDOW_NS = 2 * 10**9
+
+
+def cache_dir() -> Path:
+    """
+    Directory where npmnuke keeps its caches, ~/.cache/npmnuke by default.
+    """
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg_cache_home) if xdg_cache_home else Path.home() / ".cache"
+
+    return base / "npmnuke"
+
+
+def _root_key(target_dir: Path) -> str:
+    return hashlib.sha1(str(target_dir.resolve()).encode()).hexdigest()[:16]
+
+
+def _write_json(path: Path, data: typing.Any, what: str) -> bool:
+    """
+    Write `data` to `path` through a temporary file, so a reader never sees
+    a half written file. Return False when it could not be written.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning(f"Could not write {what} {path}: {e}")
+        return False
+
+    return True
+
+
+class ScanIndex:
+    """
+    On-disk index of the directories visited by a scan.
+
+    For every directory it stores the mtime and inode together with the
+    names of its subdirectories. When a directory's mtime and inode did not
+    change since the last scan, the stored names are used instead of reading
+    the directory again.
+    """
+
+    def __init__(self, root: str, path: Path | None = None) -> None:
+        self.root = root
+        self.path = path
+        self._entries: typing.Dict[str, list] = {}
+        self._visited: typing.Dict[str, list] = {}
+        self._started_ns = time.time_ns()
+
+    @classmethod
+    def load(cls, target_dir: Path, directory: Path | None = None) -> "ScanIndex":
+        """
+        Load the index of `target_dir`, or start a new one when there is none.
+        """
+        root = str(target_dir)
+        key = _root_key(target_dir)
+        path = (directory or cache_dir()) / f"scan-index-{key}.json"
+
+        index = cls(root, path)
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return index
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read scan index {path}: {e}")
+            return index
+
+        if data.get("version") != INDEX_VERSION or data.get("root") != root:
+            log.debug(f"Discarding outdated scan index {path}")
+            return index
+
+        index._entries = data.get("entries", {})
+        log.debug(f"Loaded scan index {path} with {len(index._entries)} entries")
+
+        return index
+
+    def save(self) -> None:
+        """
+        Write the directories visited by this scan back to disk.
+        Directories that were not visited are dropped.
+        """
+        if self.path is None:
+            return
+
+        data = {"version": INDEX_VERSION, "root": self.root, "entries": self._visited}
+
+        if not _write_json(self.path, data, "scan index"):
+            return
+
+        log.debug(f"Saved scan index {self.path} with {len(self._visited)} entries")
+
+    def get(self, dir: str, stat: os.stat_result) -> list[str] | None:
+        """
+        Return the subdirectory names of `dir` if it did not change.
+        """
+        entry = self._entries.get(dir)
+
+        if entry is None:
+            return None
+
+        mtime_ns, ino, names = entry
+
+        if mtime_ns != stat.st_mtime_ns or ino != stat.st_ino:
+            return None
+
+        self._visited[dir] = entry
+        return names
+
+    def set(self, dir: str, stat: os.stat_result, names: list[str]) -> None:
+        """
+        Record the subdirectory names of `dir`, `stat` has to be taken
+        before the directory was read.
+        """
+        if self._started_ns - stat.st_mtime_ns < RACY_MTIME_WINDOW_NS:
+            return
+
+        self._visited[dir] = [stat.st_mtime_ns, stat.st_ino, names]
+
+
+FRONTIER_VERSION = 1
+
+
+class ScanFrontier:
+    """
+    Directories a scan did not get to before its time budget ran out,
+    saved so the next scan of the same directory can continue from them.
+    """
+
+    def __init__(self, root: str, path: Path | None = None) -> None:
+        self.root = root
+        self.path = path
+        self.dirs: list[str] = []
+
+    @classmethod
+    def load(
+        cls, target_dir: Path, resume=True, directory: Path | None = None
+    ) -> "ScanFrontier":
+        """
+        Load the frontier left by the last scan of `target_dir`. Without
+        `resume`, or when there is none, the scan starts from the beginning.
+        """
+        root = str(target_dir)
+        key = _root_key(target_dir)
+        path = (directory or cache_dir()) / f"scan-frontier-{key}.json"
+
+        frontier = cls(root, path)
+
+        if not resume:
+            return frontier
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return frontier
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read scan frontier {path}: {e}")
+            return frontier
+
+        if data.get("version") != FRONTIER_VERSION or data.get("root") != root:
+            log.debug(f"Discarding outdated scan frontier {path}")
+            return frontier
+
+        frontier.dirs = data.get("dirs", [])
+        log.debug(f"Loaded scan frontier {path} with {len(frontier.dirs)} directories")
+
+        return frontier
+
+    def save(self) -> None:
+        """
+        Write the directories left to scan to disk, or remove the file when
+        the scan is complete.
+        """
+        if self.path is None:
+            return
+
+        if not self.dirs:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning(f"Could not remove scan frontier {self.path}: {e}")
+            return
+
+        data = {"version": FRONTIER_VERSION, "root": self.root, "dirs": self.dirs}
+
+        if not _write_json(self.path, data, "scan frontier"):
+            return
+
+        log.debug(f"Saved scan frontier {self.path} with {len(self.dirs)} directories")
+
+
+SIZE_CACHE_VERSION = 1
+
+# files whose change means node_modules was (re)installed
+LOCKFILES = ("package-lock.json", "yarn.lock", "pnpm-lock.yaml")
+NODE_MODULES_MARKERS = (".package-lock.json", ".modules.yaml", ".yarn-integrity")
+
+
+def size_fingerprint(
+    path: Path, members: typing.Sequence[Path] = ()
+) -> list[int] | None:
+    """
+    Cheap fingerprint of the node_modules folder in `path`, built from the
+    inode and mtime of node_modules, the lockfiles next to it and the
+    metadata files package managers write into it. The node_modules folders
+    of workspace `members` are part of it.
+    Return None when there is no node_modules folder.
+    """
+    fingerprint = _node_modules_fingerprint(path)
+
+    if fingerprint is None:
+        return None
+
+    for member in members:
+        fingerprint += _node_modules_fingerprint(member) or [0]
+
+    return fingerprint
+
+
+def _node_modules_fingerprint(path: Path) -> list[int] | None:
+    node_modules_dir = os.path.join(path, "node_modules")
+
+    try:
+        stat = os.stat(node_modules_dir)
+    except OSError:
+        return None
+
+    fingerprint = [stat.st_ino, stat.st_mtime_ns]
+
+    files = [os.path.join(path, name) for name in LOCKFILES] + [
+        os.path.join(node_modules_dir, name) for name in NODE_MODULES_MARKERS
+    ]
+
+    for file in files:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            fingerprint += [0, 0]
+            continue
+
+        fingerprint += [stat.st_ino, stat.st_mtime_ns]
+
+    return fingerprint
+
+
+class SizeCache:
+    """
+    On-disk cache of node_modules sizes, keyed by the project folder.
+
+    An entry is only used while the folder's `size_fingerprint` is unchanged.
+    Entries that were not used for `max_age` seconds are dropped, and at most
+    `max_entries` of the most recently used entries are kept.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        max_entries: int = 10000,
+        max_age: float = 30 * 24 * 60 * 60,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: typing.Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: Path | None = None, **kwargs) -> "SizeCache":
+        """
+        Load the size cache, or start a new one when there is none.
+        """
+        path = (directory or cache_dir()) / "sizes.json"
+
+        cache = cls(path, **kwargs)
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cache
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read size cache {path}: {e}")
+            return cache
+
+        if data.get("version") != SIZE_CACHE_VERSION:
+            log.debug(f"Discarding outdated size cache {path}")
+            return cache
+
+        cache._entries = data.get("entries", {})
+        log.debug(f"Loaded size cache {path} with {len(cache._entries)} entries")
+
+        return cache
+
+    def save(self) -> None:
+        """
+        Evict old entries and write the cache back to disk.
+        """
+        if self.path is None:
+            return
+
+        with self._lock:
+            self._evict()
+            data = {"version": SIZE_CACHE_VERSION, "entries": dict(self._entries)}
+
+        if not _write_json(self.path, data, "size cache"):
+            return
+
+        log.debug(f"Saved size cache {self.path} with {len(data['entries'])} entries")
+
+    def get(self, path: Path, fingerprint: list[int] | None) -> float | None:
+        """
+        Return the cached size in MB of the node_modules folder in `path`.
+        """
+        if fingerprint is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+
+            if entry is None or entry[0] != fingerprint:
+                return None
+
+            entry[2] = time.time()
+            return entry[1]
+
+    def set(self, path: Path, fingerprint: list[int] | None, size: float) -> None:
+        """
+        Cache `size`, `fingerprint` has to be taken before the size was calculated.
+        """
+        if fingerprint is None:
+            return
+
+        with self._lock:
+            self._entries[os.path.abspath(path)] = [fingerprint, size, time.time()]
+
+    def _evict(self) -> None:
+        oldest = time.time() - self.max_age
+
+        entries = [
+            (key, entry) for key, entry in self._entries.items() if entry[2] >= oldest
+        ]
+
+        if len(entries) > self.max_entries:
+            entries.sort(key=lambda item: item[1][2], reverse=True)
+            entries = entries[: self.max_entries]
+
+        self._entries = dict(entries)
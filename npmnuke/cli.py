@@ -1,27 +1,46 @@
+from concurrent.futures import Future, as_completed
 from pathlib import Path
 
 import click
 from halo import Halo
 
 from npmnuke import __version__
+from npmnuke.cache import ScanFrontier, ScanIndex, SizeCache
 from npmnuke.files import (
     NODE_MODULES,
-    calculate_size,
-    find_node_modules_dirs,
+    format_age,
     remove_node_modules,
+    scan_kwargs,
+    scan_node_modules_dirs,
 )
 from npmnuke.logger import log
-from npmnuke.models import DialogSettings
+from npmnuke.models import DialogSettings, NodeFolder, RemoveProgress
+from npmnuke.pool import SizePool
+from npmnuke.remove import ProgressTotal
+from npmnuke.tombstone import Reaper
+from npmnuke.top import TopFolders
 
 
 def start_remove_dialog(
     node_modules_dirs: list[Path],
     calculated_size: list[float] | None = None,
     dry_run=False,
+    remove_jobs: int = 1,
+    reaper: Reaper | None = None,
+    exact_sizes: list[Future[float]] | None = None,
+    last_activity: list[float | None] | None = None,
+    members: list[list[Path]] | None = None,
 ) -> float:
     """
     Start the dialog with the user. Ask the user which node_modules
     folders to delete and delete them.
+    With a `reaper` the folders are moved to tombstones and deleted in the
+    background instead.
+    With `exact_sizes` the calculated sizes are estimates, the exact size
+    is shown once it is known and waited for before a folder is deleted.
+    With `last_activity` the time since each project was last worked on is
+    shown as well. The node_modules folders of workspace `members` are
+    deleted together with their workspace root.
     Return the total amount of MB deleted.
     """
     print("Which node_modules folders do you want to delete?")
@@ -30,6 +49,19 @@ def start_remove_dialog(
 
     for i, dir in enumerate(node_modules_dirs):
         size_str = f"{calculated_size[i]:.2f} MB" if calculated_size else ""
+
+        if exact_sizes:
+            if exact_sizes[i].done():
+                size_str = f"{exact_sizes[i].result():.2f} MB"
+            else:
+                size_str = f"~{size_str}"
+
+        if last_activity:
+            size_str = f"{size_str} {format_age(last_activity[i])}"
+
+        if members and members[i]:
+            size_str = f"{size_str} (workspace, {len(members[i])} packages)"
+
         print(f"{i + 1}: {dir} {size_str}")
 
     print("")
@@ -57,13 +89,36 @@ def start_remove_dialog(
 
     total_cleaned_mb = 0
 
-    with click.progressbar(indexes, label="Removing") as indexes:
-        for i in indexes:
+    with click.progressbar(indexes, label="Removing") as bar:
+
+        def report(progress: RemoveProgress) -> None:
+            mb = progress.bytes / 1024 / 1024
+            bar.label = f"Removing ({progress.files} files, {mb:.2f} MB)"
+            bar.render_progress()
+
+        # files and bytes of all removed folders, while they are removed
+        removed = ProgressTotal(report, interval=0.1)
+
+        for i in bar:
             dir = node_modules_dirs[i]
             size = calculated_size[i] if calculated_size else 0.0
 
-            if not dry_run:
-                remove_node_modules(dir)
+            if exact_sizes:
+                # the size is calculated before the folder is gone
+                size = exact_sizes[i].result()
+
+            dir_members = members[i] if members else []
+
+            if dry_run:
+                pass
+            elif reaper is not None:
+                for project in (dir, *dir_members):
+                    reaper.bury(project / NODE_MODULES)
+            else:
+                progress = remove_node_modules(
+                    dir, jobs=remove_jobs, on_progress=removed, members=dir_members
+                )
+                log.debug(f"Removed {progress.files} files, {progress.bytes} bytes")
 
             log.debug(f"Removed {dir} MB")
 
@@ -72,36 +127,170 @@ def start_remove_dialog(
     return total_cleaned_mb
 
 
+def _top_node_folders(
+    pool: SizePool, node_folders: list[NodeFolder], n: int
+) -> list[NodeFolder]:
+    """
+    Size all folders and return the `n` largest, largest first.
+    """
+    top = TopFolders(n)
+
+    futures = {
+        pool.submit(node_folder.path, members=node_folder.members): node_folder
+        for node_folder in node_folders
+    }
+
+    with click.progressbar(
+        as_completed(futures), length=len(futures), label="Calculating size"
+    ) as done:
+        for future in done:
+            node_folder = futures[future]
+            node_folder.size = future.result()
+            node_folder.size_calculated = True
+
+            top.push(node_folder)
+
+    return top.folders()
+
+
+def _estimate_sizes(
+    pool: SizePool, node_folders: list[NodeFolder]
+) -> tuple[list[Future[float]], list[float]]:
+    """
+    Start calculating the exact sizes of all folders and return their
+    futures together with quick estimates. Where no estimate is made the
+    exact size is waited for.
+    """
+    exact_sizes = [
+        pool.submit(node_folder.path, members=node_folder.members)
+        for node_folder in node_folders
+    ]
+    estimates = [
+        None if exact_size.done() else pool.estimate(node_folder.path)
+        for node_folder, exact_size in zip(node_folders, exact_sizes)
+    ]
+
+    sizes: list[float] = []
+
+    with click.progressbar(
+        zip(exact_sizes, estimates),
+        length=len(node_folders),
+        label="Estimating size",
+    ) as futures:
+        for exact_size, estimate in futures:
+            size = estimate.result() if estimate is not None else None
+            sizes.append(exact_size.result() if size is None else size)
+
+    return exact_sizes, sizes
+
+
 def non_interactive_dialog(options: DialogSettings) -> None:
+    with Reaper(jobs=options.remove_jobs) as reaper:
+        _non_interactive_dialog(options, reaper)
+
+
+def _non_interactive_dialog(options: DialogSettings, reaper: Reaper) -> None:
     print(f"> npmnuke 💥 {__version__}")
 
     print(f"Scanning '{options.target_dir}' for '{NODE_MODULES}' folders")
 
+    size_during_scan = options.size_during_scan and not options.skip_calculating_size
+
+    index = ScanIndex.load(options.target_dir) if options.incremental else None
+    frontier = (
+        ScanFrontier.load(options.target_dir, resume=options.resume)
+        if options.time_budget is not None or options.resume
+        else None
+    )
+    size_cache = SizeCache.load() if options.size_cache else None
+
     with Halo(text="Loading", spinner="dots", enabled=not options.verbose):
-        node_modules_dirs = list(
-            find_node_modules_dirs(
+        node_folders = list(
+            scan_node_modules_dirs(
                 options.target_dir,
-                ignore_dot=options.ignore_dot,
-                ignore_set=options.ignore_set,
+                **scan_kwargs(
+                    options, index=index, size_cache=size_cache, frontier=frontier
+                ),
             )
         )
 
+    if index is not None:
+        index.save()
+
+    if frontier is not None:
+        frontier.save()
+
+    node_modules_dirs = [node_folder.path for node_folder in node_folders]
+
     print(f"Found {len(node_modules_dirs)} '{NODE_MODULES}' folders")
 
     if not node_modules_dirs:
         return
 
-    calculated_size = None
-    if not options.skip_calculating_size:
-        with click.progressbar(
-            node_modules_dirs, label="Calculating size"
-        ) as dirs_queue:
-            calculated_size = [calculate_size(dir / NODE_MODULES) for dir in dirs_queue]
-
-    total_cleaned_mb = start_remove_dialog(
-        node_modules_dirs,
-        calculated_size,
-        options.dry_run,
+    pool = SizePool(
+        jobs=options.size_jobs,
+        cache=size_cache,
+        disk_usage=options.disk_usage,
+        size_order=options.size_order,
     )
 
+    try:
+        calculated_size = None
+        exact_sizes = None
+        if size_during_scan:
+            if options.top:
+                top = TopFolders(options.top)
+                for node_folder in node_folders:
+                    top.push(node_folder)
+                node_folders = top.folders()
+                node_modules_dirs = [node_folder.path for node_folder in node_folders]
+
+            calculated_size = [node_folder.size for node_folder in node_folders]
+        elif not options.skip_calculating_size:
+            if options.top:
+                node_folders = _top_node_folders(pool, node_folders, options.top)
+                node_modules_dirs = [node_folder.path for node_folder in node_folders]
+                calculated_size = [node_folder.size for node_folder in node_folders]
+            elif options.estimate_sizes:
+                exact_sizes, calculated_size = _estimate_sizes(pool, node_folders)
+            else:
+                futures = [
+                    pool.submit(node_folder.path, members=node_folder.members)
+                    for node_folder in node_folders
+                ]
+
+                with click.progressbar(
+                    (future.result() for future in futures),
+                    length=len(futures),
+                    label="Calculating size",
+                ) as sizes:
+                    calculated_size = list(sizes)
+
+        if options.top:
+            print(
+                f"Showing the {len(node_modules_dirs)} largest '{NODE_MODULES}' folders"
+            )
+
+        if calculated_size:
+            approximate = exact_sizes and not all(size.done() for size in exact_sizes)
+            print(
+                f"Total size: {'~' if approximate else ''}{sum(calculated_size):.2f} MB"
+            )
+
+        total_cleaned_mb = start_remove_dialog(
+            node_modules_dirs,
+            calculated_size,
+            options.dry_run,
+            options.remove_jobs,
+            reaper if options.background_remove else None,
+            exact_sizes,
+            [node_folder.last_activity for node_folder in node_folders],
+            [node_folder.members for node_folder in node_folders],
+        )
+    finally:
+        pool.shutdown()
+
+        if size_cache is not None:
+            size_cache.save()
+
     click.secho(f"Cleaned {total_cleaned_mb:.2f} MB", fg="green", bold=True)
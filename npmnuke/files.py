@@ -1,13 +1,38 @@
+import asyncio
+import collections
+import contextlib
 import os
-import shutil
+import queue
+import random
+import threading
+import time
 import typing
+from array import array
+from dataclasses import dataclass, field
 from pathlib import Path
+from stat import S_ISDIR
 
+from npmnuke.cache import (
+    LOCKFILES,
+    NODE_MODULES_MARKERS,
+    ScanFrontier,
+    ScanIndex,
+    SizeCache,
+    size_fingerprint,
+)
+from npmnuke.ignore import IgnoreMatcher
 from npmnuke.logger import log
-from npmnuke.models import IgnoreSet
+from npmnuke.models import DialogSettings, IgnoreSet, NodeFolder, RemoveProgress
+from npmnuke.mounts import skipped_mount_points
+from npmnuke.remove import ProgressCallback, remove_tree
+from npmnuke.tombstone import TOMBSTONE_PREFIX
+from npmnuke.workspace import workspace_members
 
 NODE_MODULES = "node_modules"
 
+# folders that contain this file are not scanned
+IGNORE_MARKER = ".npmnukeignore"
+
 if "nt" == os.name:
     # https://github.com/python/cpython/issues/67596
     # https://github.com/bleachbit/bleachbit/issues/668
@@ -21,77 +46,1009 @@ if "nt" == os.name:
     path_islink = os.path.islink
     os.path.islink = lambda path: path_islink(path) or is_junction(path)
 
+    def _is_link(entry: os.DirEntry) -> bool:
+        return entry.is_symlink() or is_junction(entry.path)
 
-def _find_node_modules_dirs(
-    target_dir: Path, ignore_dot=False, ignore_set: IgnoreSet = None
-) -> typing.Iterator[Path]:
-    if not target_dir.exists() or not target_dir.is_dir():
-        raise ValueError(f"Directory {target_dir} does not exist")
+else:
+
+    def _is_link(entry: os.DirEntry) -> bool:
+        return entry.is_symlink()
+
+
+# multiplier of the Fibonacci hashing of inode numbers, 2**64 / golden ratio
+_INODE_HASH = 0x9E3779B97F4A7C15
+_UINT64 = (1 << 64) - 1
+
+
+class _InodeTable:
+    """
+    Set of the inode numbers of one device, an open addressing hash table
+    in an `array` of 64 bit ints where 0 marks a free slot. At most half of
+    the slots are used, so a file takes 16 to 32 bytes.
+    """
+
+    __slots__ = ("_slots", "_shift", "_used", "_others")
+
+    def __init__(self) -> None:
+        self._slots = array("Q", bytes(8 * 1024))
+        self._shift = 64 - 10
+        self._used = 0
+        # inode 0 and inodes that do not fit in 64 bits, e.g. on ReFS
+        self._others: typing.Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._used + len(self._others)
+
+    def add(self, ino: int) -> bool:
+        if ino == 0 or ino > _UINT64:
+            if ino in self._others:
+                return False
+
+            self._others.add(ino)
+            return True
+
+        if not self._insert(ino):
+            return False
+
+        self._used += 1
+
+        if self._used * 2 > len(self._slots):
+            self._grow()
+
+        return True
+
+    def _insert(self, ino: int) -> bool:
+        slots = self._slots
+        mask = len(slots) - 1
+        i = ((ino * _INODE_HASH) & _UINT64) >> self._shift
+
+        while True:
+            slot = slots[i]
+
+            if slot == 0:
+                slots[i] = ino
+                return True
+
+            if slot == ino:
+                return False
+
+            i = (i + 1) & mask
+
+    def _grow(self) -> None:
+        old_slots = self._slots
+        self._slots = array("Q", bytes(16 * len(old_slots)))
+        self._shift -= 1
+
+        for ino in old_slots:
+            if ino:
+                self._insert(ino)
+
+
+class InodeSet:
+    """
+    Thread-safe set of the (st_dev, st_ino) pairs of hardlinked files.
+    Files with a single link and directories can not be counted twice, so
+    they are never stored, unless `hardlinks_only` is False, e.g. for
+    directories reached through symlinks.
+
+    The inodes of each device are kept in a hash table of 64 bit ints, 16
+    to 32 bytes per file instead of the ~70 of a Python set of ints, so
+    tens of millions of files take hundreds of MB rather than GBs.
+    """
+
+    def __init__(self, hardlinks_only=True) -> None:
+        self._tables: typing.Dict[int, _InodeTable] = {}
+        self._lock = threading.Lock()
+        self._hardlinks_only = hardlinks_only
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(table) for table in self._tables.values())
+
+    def add(self, stat: os.stat_result) -> bool:
+        """
+        Add the file, return False when it was already seen.
+        """
+        if self._hardlinks_only and (stat.st_nlink < 2 or S_ISDIR(stat.st_mode)):
+            return True
 
-    log.debug(f"Scanning {target_dir}...")
+        with self._lock:
+            table = self._tables.get(stat.st_dev)
 
-    for dir in target_dir.iterdir():
-        if not dir.is_dir():
+            if table is None:
+                table = self._tables[stat.st_dev] = _InodeTable()
+
+            return table.add(stat.st_ino)
+
+
+def _disk_usage(stat: os.stat_result) -> int:
+    # st_blocks is not available on Windows
+    blocks = getattr(stat, "st_blocks", None)
+    return stat.st_size if blocks is None else blocks * 512
+
+
+@dataclass
+class _ScanOptions:
+    """
+    Options shared by the sequential and the parallel scanner.
+    """
+
+    ignore_dot: bool = False
+    ignore: IgnoreMatcher | None = None
+    # scanned directory with a trailing separator, ignore patterns are
+    # matched against paths relative to it
+    root: str = ""
+    # device of the scanned directory, set to stay on its filesystem
+    root_dev: int | None = None
+    # mount points of skipped filesystem types
+    skipped_mounts: typing.Set[str] = field(default_factory=set)
+    raises: bool = False
+    calculate_sizes: bool = False
+    index: ScanIndex | None = None
+    size_cache: SizeCache | None = None
+    disk_usage: bool = False
+    seen_inodes: InodeSet | None = None
+    workspaces: bool = False
+    # member folders of the workspaces found so far, they are not scanned
+    workspace_members: typing.Set[str] = field(default_factory=set)
+    # directories scanned so far, set to follow linked directories
+    visited: InodeSet | None = None
+    # subdirectories deeper than this are not scanned
+    max_depth: int | None = None
+    # time.monotonic() after which directories are deferred instead of scanned
+    deadline: float | None = None
+    deferred: list[str] = field(default_factory=list)
+    # set to end the scan early, the remaining directories are skipped
+    stop: threading.Event | None = None
+
+
+# appended to the names of linked directories, it can not be part of a name
+LINK_SUFFIX = "/"
+
+
+def _read_subdir_names(dir: str, options: _ScanOptions) -> list[str]:
+    """
+    Return the names of all subdirectories of `dir`, from the scan index
+    when the directory did not change since the last scan. When `dir`
+    contains an ignore marker its name is part of the list as well.
+    Names of linked directories end with `LINK_SUFFIX`.
+    """
+    index = options.index
+
+    if index is not None:
+        stat = os.stat(dir)
+        names = index.get(dir, stat)
+
+        if names is not None:
+            return names
+
+    with os.scandir(dir) as it:
+        entries = list(it)
+
+    names = []
+    for entry in entries:
+        if entry.name == IGNORE_MARKER:
+            # found in the listing we already have, no extra stat
+            names.append(entry.name)
             continue
 
-        if (ignore_dot and dir.name.startswith(".")) or (
-            ignore_set and dir.name in ignore_set
+        try:
+            # uses the type cached by readdir, no extra stat on most platforms
+            if entry.is_dir():
+                names.append(
+                    entry.name + LINK_SUFFIX if _is_link(entry) else entry.name
+                )
+        except OSError:
+            continue
+
+    if index is not None:
+        index.set(dir, stat, names)
+
+    return names
+
+
+def _depth(dir: str, options: _ScanOptions) -> int:
+    if os.path.join(dir, "") == options.root:
+        return 0
+
+    return dir[len(options.root) :].count(os.sep) + 1
+
+
+def _on_device(dir: str, options: _ScanOptions) -> bool:
+    try:
+        return os.stat(dir).st_dev == options.root_dev
+    except OSError:
+        # unreadable directories are reported when they are scanned
+        return True
+
+
+def _scan_dir(dir: str, options: _ScanOptions) -> tuple[bool, list[str]]:
+    """
+    Read a single directory and return whether it contains a node_modules
+    folder together with the subdirectories that should be scanned next.
+    """
+    log.debug(f"Scanning {dir}...")
+
+    has_node_modules = False
+    subdirs: list[str] = []
+
+    try:
+        if options.visited is not None and not options.visited.add(os.stat(dir)):
+            log.debug(f"Skipping {dir}, it was already scanned through a link")
+            return has_node_modules, subdirs
+
+        names = _read_subdir_names(dir, options)
+    except OSError as e:
+        if options.raises:
+            log.error(e)
+            raise e
+
+        log.warning(e)
+        return has_node_modules, subdirs
+
+    if IGNORE_MARKER in names and os.path.join(dir, "") != options.root:
+        # the marker in the scanned folder itself is the default ignore file
+        log.debug(f"Ignoring {dir}, it contains {IGNORE_MARKER}")
+        return has_node_modules, subdirs
+
+    ignore_dot = options.ignore_dot
+    ignore = options.ignore
+
+    at_max_depth = (
+        options.max_depth is not None and _depth(dir, options) >= options.max_depth
+    )
+
+    relative_dir = ""
+    if ignore and dir.startswith(options.root):
+        relative_dir = dir[len(options.root) :].replace(os.sep, "/") + "/"
+
+    for name in names:
+        if name == IGNORE_MARKER:
+            continue
+
+        linked = name.endswith(LINK_SUFFIX)
+        if linked:
+            name = name[: -len(LINK_SUFFIX)]
+
+        if name.startswith(TOMBSTONE_PREFIX):
+            # a removed node_modules folder that is not deleted yet
+            continue
+
+        if (ignore_dot and name.startswith(".")) or (
+            ignore and ignore.match(relative_dir + name, name)
         ):
-            log.debug(f"Ignoring {dir}")
+            log.debug(f"Ignoring {os.path.join(dir, name)}")
             continue
 
-        if dir.name == NODE_MODULES:
-            yield dir.parent
-        else:
-            yield from find_node_modules_dirs(
-                dir, ignore_dot=ignore_dot, ignore_set=ignore_set
+        if name == NODE_MODULES:
+            has_node_modules = True
+            continue
+
+        if at_max_depth:
+            continue
+
+        if linked and options.visited is None:
+            log.debug(f"Ignoring {os.path.join(dir, name)}, it is a link")
+            continue
+
+        subdir = os.path.join(dir, name)
+
+        if subdir in options.workspace_members:
+            # already part of the result for its workspace root
+            continue
+
+        if subdir in options.skipped_mounts:
+            log.debug(f"Ignoring {subdir}, its filesystem type is skipped")
+            continue
+
+        if options.root_dev is not None and not _on_device(subdir, options):
+            log.debug(f"Ignoring {subdir}, it is on another filesystem")
+            continue
+
+        subdirs.append(subdir)
+
+    return has_node_modules, subdirs
+
+
+def _node_folder(dir: str, options: _ScanOptions) -> NodeFolder:
+    """
+    Build the result for a folder that contains a node_modules folder.
+    """
+    node_folder = NodeFolder(path=Path(dir), last_activity=last_activity(Path(dir)))
+
+    if options.workspaces:
+        members = workspace_members(dir)
+        options.workspace_members.update(members)
+
+        node_folder.members = [
+            Path(member)
+            for member in members
+            if os.path.isdir(os.path.join(member, NODE_MODULES))
+        ]
+
+    if options.calculate_sizes:
+        size_cache = options.size_cache
+        fingerprint = None
+        size = None
+
+        if size_cache is not None:
+            fingerprint = size_fingerprint(dir, node_folder.members)
+            size = size_cache.get(dir, fingerprint)
+
+        if size is None:
+            size = (
+                sum(
+                    _calculate_size(
+                        os.path.join(project, NODE_MODULES),
+                        raises=options.raises,
+                        disk_usage=options.disk_usage,
+                        seen_inodes=options.seen_inodes,
+                    )
+                    for project in (dir, *node_folder.members)
+                )
+                / 1024
+                / 1024
             )
 
+            if size_cache is not None:
+                size_cache.set(dir, fingerprint, size)
+
+        node_folder.size = size
+        node_folder.size_calculated = True
+
+    return node_folder
+
+
+def _visit(dir: str, options: _ScanOptions) -> tuple[NodeFolder | None, list[str]]:
+    """
+    Scan a single directory, return its result when it contains a
+    node_modules folder and the subdirectories that should be scanned next.
+    Once the deadline passed the directory is deferred instead, once the
+    scan is stopped it is skipped.
+    """
+    if options.stop is not None and options.stop.is_set():
+        return None, []
+
+    if options.deadline is not None and time.monotonic() >= options.deadline:
+        options.deferred.append(dir)
+        return None, []
+
+    has_node_modules, subdirs = _scan_dir(dir, options)
+
+    if not has_node_modules:
+        return None, subdirs
+
+    try:
+        node_folder = _node_folder(dir, options)
+    except OSError as e:
+        if options.raises:
+            log.error(e)
+            raise e
+
+        log.warning(e)
+        return None, subdirs
+
+    if node_folder.members:
+        subdirs = [
+            subdir for subdir in subdirs if subdir not in options.workspace_members
+        ]
+
+    return node_folder, subdirs
+
+
+def _scan_node_modules_dirs(
+    target_dir: Path, options: _ScanOptions, dirs: list[str]
+) -> typing.Iterator[NodeFolder]:
+    if not target_dir.exists() or not target_dir.is_dir():
+        raise ValueError(f"Directory {target_dir} does not exist")
+
+    stack = list(reversed(dirs))
+
+    while stack:
+        dir = stack.pop()
+
+        node_folder, subdirs = _visit(dir, options)
+
+        if node_folder is not None:
+            yield node_folder
+
+        # reversed to keep the same depth-first order as a recursive walk
+        stack.extend(reversed(subdirs))
+
+
+def _parallel_scan_node_modules_dirs(
+    target_dir: Path, options: _ScanOptions, dirs: list[str], jobs: int
+) -> typing.Iterator[NodeFolder]:
+    """
+    Same as `_scan_node_modules_dirs`, but `jobs` threads pull directories
+    from a shared queue, so many readdir calls can be in flight at once.
+    Results are yielded as soon as any worker finds them, in no particular order.
+    """
+    if not target_dir.exists() or not target_dir.is_dir():
+        raise ValueError(f"Directory {target_dir} does not exist")
+
+    # LIFO keeps the walk roughly depth-first and the pending frontier small
+    work_queue: queue.LifoQueue[str | None] = queue.LifoQueue()
+    results: queue.SimpleQueue[NodeFolder | Exception | None] = queue.SimpleQueue()
+    stop = threading.Event()
+
+    pending = len(dirs)
+    pending_lock = threading.Lock()
+
+    def worker() -> None:
+        nonlocal pending
+
+        while not stop.is_set():
+            dir = work_queue.get()
+
+            if dir is None:
+                break
+
+            try:
+                node_folder, subdirs = _visit(dir, options)
+
+                if node_folder is not None:
+                    results.put(node_folder)
+            except Exception as e:
+                # any error ends the scan, as it does in the sequential one
+                results.put(e)
+                break
+
+            for subdir in subdirs:
+                work_queue.put(subdir)
+
+            with pending_lock:
+                pending += len(subdirs) - 1
+
+                if pending == 0:
+                    # the whole tree is scanned
+                    results.put(None)
+
+    for dir in reversed(dirs):
+        work_queue.put(dir)
+
+    threads = [
+        threading.Thread(target=worker, name=f"npmnuke-scan-{i}", daemon=True)
+        for i in range(jobs)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            result = results.get()
+
+            if result is None:
+                break
+
+            if isinstance(result, Exception):
+                raise result
+
+            yield result
+    finally:
+        # also reached when the consumer stops iterating early
+        stop.set()
+        for _ in threads:
+            work_queue.put(None)
+
+
+def scan_node_modules_dirs(
+    target_dir: Path,
+    raises=False,
+    ignore_dot=True,
+    ignore_set: IgnoreSet | IgnoreMatcher | None = None,
+    jobs: int = 1,
+    calculate_sizes=False,
+    index: ScanIndex | None = None,
+    size_cache: SizeCache | None = None,
+    disk_usage=False,
+    workspaces=False,
+    one_file_system=False,
+    skip_fs_types: typing.Collection[str] = (),
+    follow_links=False,
+    max_depth: int | None = None,
+    time_budget: float | None = None,
+    frontier: ScanFrontier | None = None,
+    stop: threading.Event | None = None,
+) -> typing.Iterator[NodeFolder]:
+    """
+    Find all folders that contain a node_modules folder and yield them as
+    `NodeFolder` results.
+
+    Directories matching `ignore_set`, gitignore patterns given as a set or
+    an already compiled `IgnoreMatcher`, are not scanned.
+
+    With `calculate_sizes` the size of every node_modules folder is
+    calculated as soon as it is found, as part of the same walk.
+    With an `index` directories that did not change since the last scan
+    are not read again, call `index.save()` after the scan to update it.
+    A `size_cache` is used for sizes of folders that did not change.
+    With `disk_usage` sizes are reclaimable bytes, see `calculate_size`,
+    with hardlinked files counted once per scan.
+    With `workspaces` the member packages of a workspace root (package.json
+    `workspaces`, pnpm-workspace.yaml) are not scanned, their node_modules
+    folders are part of the root's result and size instead.
+    With `one_file_system` directories on other filesystems than
+    `target_dir` are not scanned, nor are mount points of a filesystem type
+    in `skip_fs_types`.
+    Linked directories are not scanned, with `follow_links` they are and
+    every directory is scanned once, even when several links lead to it.
+    With `max_depth` only directories up to that many levels below
+    `target_dir` are scanned.
+    With a `time_budget` in seconds the scan stops once it is used up and
+    the directories it did not get to are stored in `frontier`. A
+    `frontier` that already holds directories is continued instead of
+    scanning `target_dir` from the start, call `frontier.save()` after the
+    scan to update it.
+    Once `stop` is set the scan ends without reading any more directories,
+    also while no folder is found that could be yielded.
+    """
+    if ignore_set is not None and not isinstance(ignore_set, IgnoreMatcher):
+        ignore_set = IgnoreMatcher(ignore_set)
+
+    root_dev = None
+    if one_file_system:
+        try:
+            root_dev = os.stat(target_dir).st_dev
+        except OSError:
+            # reported when the directory is scanned
+            pass
+
+    root = str(target_dir)
+    if not root.endswith(os.sep):
+        root += os.sep
+
+    options = _ScanOptions(
+        ignore_dot=ignore_dot,
+        ignore=ignore_set,
+        root=root,
+        raises=raises,
+        calculate_sizes=calculate_sizes,
+        index=index,
+        size_cache=size_cache,
+        disk_usage=disk_usage,
+        seen_inodes=InodeSet() if disk_usage else None,
+        workspaces=workspaces,
+        root_dev=root_dev,
+        skipped_mounts=skipped_mount_points(str(target_dir), skip_fs_types),
+        visited=InodeSet(hardlinks_only=False) if follow_links else None,
+        max_depth=max_depth,
+        deadline=None if time_budget is None else time.monotonic() + time_budget,
+        stop=stop,
+    )
+
+    dirs = frontier.dirs if frontier is not None and frontier.dirs else None
+
+    if dirs:
+        log.debug(f"Continuing the last scan from {len(dirs)} directories")
+    else:
+        dirs = [str(target_dir)]
+
+    if jobs > 1:
+        yield from _parallel_scan_node_modules_dirs(target_dir, options, dirs, jobs)
+    else:
+        yield from _scan_node_modules_dirs(target_dir, options, dirs)
+
+    if options.deferred:
+        log.warning(
+            f"Time budget used up, {len(options.deferred)} directories left to scan"
+        )
+
+    if frontier is not None:
+        frontier.dirs = options.deferred
+
+
+def scan_kwargs(settings: DialogSettings, **kwargs) -> typing.Dict[str, typing.Any]:
+    """
+    Return the keyword arguments of `scan_node_modules_dirs` for the scan
+    of a dialog with `settings`, together with `kwargs`.
+    """
+    size_during_scan = settings.size_during_scan and not settings.skip_calculating_size
+
+    return dict(
+        ignore_dot=settings.ignore_dot,
+        ignore_set=settings.ignore_set,
+        jobs=settings.jobs,
+        calculate_sizes=size_during_scan,
+        disk_usage=settings.disk_usage,
+        workspaces=settings.workspaces,
+        one_file_system=settings.one_file_system,
+        skip_fs_types=settings.skip_fs_types,
+        follow_links=settings.follow_links,
+        max_depth=settings.max_depth,
+        time_budget=settings.time_budget,
+        **kwargs,
+    )
+
 
 def find_node_modules_dirs(
-    target_dir: Path, raises=False, ignore_dot=True, ignore_set: IgnoreSet = None
+    target_dir: Path,
+    raises=False,
+    ignore_dot=True,
+    ignore_set: IgnoreSet | IgnoreMatcher | None = None,
+    jobs: int = 1,
+    index: ScanIndex | None = None,
+    one_file_system=False,
+    skip_fs_types: typing.Collection[str] = (),
+    follow_links=False,
+    max_depth: int | None = None,
+    time_budget: float | None = None,
+    frontier: ScanFrontier | None = None,
 ) -> typing.Iterator[Path]:
     """
     Find all folders that contain a node_modules folder.
     Not search for nested node_modules folders.
+
+    Unreadable directories are skipped with a warning, unless `raises` is set.
+    With `jobs` > 1 the tree is scanned by that many threads and results
+    are yielded in no particular order.
     """
+    for node_folder in scan_node_modules_dirs(
+        target_dir,
+        raises=raises,
+        ignore_dot=ignore_dot,
+        ignore_set=ignore_set,
+        jobs=jobs,
+        index=index,
+        one_file_system=one_file_system,
+        skip_fs_types=skip_fs_types,
+        follow_links=follow_links,
+        max_depth=max_depth,
+        time_budget=time_budget,
+        frontier=frontier,
+    ):
+        yield node_folder.path
+
+
+# node folders an async scan finds ahead of its consumer
+ASYNC_SCAN_PENDING = 256
+
+# handed to the loop once the async scan is finished
+_SCAN_DONE = object()
+
+
+async def ascan_node_modules_dirs(
+    target_dir: Path,
+    max_pending: int = ASYNC_SCAN_PENDING,
+    **kwargs,
+) -> typing.AsyncIterator[NodeFolder]:
+    """
+    Async version of `scan_node_modules_dirs`, it takes the same keyword
+    arguments.
+
+    The scan runs on a daemon thread, which stops scanning once the
+    consumer stops iterating and never holds up the exit. Results are
+    handed to the loop in batches, everything found while the loop was busy
+    arrives with a single wakeup. Once `max_pending` results wait to be
+    consumed the scan pauses until the consumer catches up.
+    """
+    loop = asyncio.get_running_loop()
+    batch: collections.deque[object] = collections.deque()
+    batch_lock = threading.Lock()
+    ready = asyncio.Event()
+    slots = threading.Semaphore(max_pending)
+    stop = threading.Event()
+
+    def hand_over(item: object) -> None:
+        with batch_lock:
+            wake = not batch
+            batch.append(item)
+
+        if wake:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # the loop is already closed
+                pass
+
+    def produce() -> None:
+        result: object = _SCAN_DONE
+
+        try:
+            with contextlib.closing(
+                scan_node_modules_dirs(target_dir, stop=stop, **kwargs)
+            ) as node_folders:
+                for node_folder in node_folders:
+                    slots.acquire()
+
+                    if stop.is_set():
+                        break
+
+                    hand_over(node_folder)
+        except Exception as e:
+            result = e
+        finally:
+            hand_over(result)
+
+    threading.Thread(target=produce, name="npmnuke-async-scan", daemon=True).start()
+
     try:
-        yield from _find_node_modules_dirs(
-            target_dir, ignore_dot=ignore_dot, ignore_set=ignore_set
-        )
-    except OSError as e:
-        if raises:
-            log.error(e)
-            raise e
-        else:
+        while True:
+            await ready.wait()
+
+            with batch_lock:
+                ready.clear()
+                items = list(batch)
+                batch.clear()
+
+            for item in items:
+                if item is _SCAN_DONE:
+                    return
+
+                if isinstance(item, Exception):
+                    raise item
+
+                slots.release()
+                yield item
+    finally:
+        # also reached when the consumer stops iterating early
+        stop.set()
+        slots.release()
+
+
+async def afind_node_modules_dirs(
+    target_dir: Path, **kwargs
+) -> typing.AsyncIterator[Path]:
+    """
+    Async version of `find_node_modules_dirs`, see `ascan_node_modules_dirs`.
+    """
+    async with contextlib.aclosing(
+        ascan_node_modules_dirs(target_dir, **kwargs)
+    ) as node_folders:
+        async for node_folder in node_folders:
+            yield node_folder.path
+
+
+def _calculate_size(
+    dir: str, raises=False, disk_usage=False, seen_inodes: InodeSet | None = None
+) -> int:
+    """
+    Calculate the size of the given directory in bytes.
+    Links are not followed, they count as the link itself.
+
+    With `disk_usage` the allocated blocks of files and directories are
+    counted instead of the file sizes and files already in `seen_inodes`
+    are skipped.
+    """
+    total_size = 0
+    stack = [dir]
+
+    if disk_usage:
+        total_size += _disk_usage(os.stat(dir, follow_symlinks=False))
+
+    while stack:
+        current = stack.pop()
+
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            if raises:
+                log.error(e)
+                raise e
+
             log.warning(e)
+            continue
+
+        for entry in entries:
+            try:
+                if disk_usage:
+                    stat = entry.stat(follow_symlinks=False)
+
+                    if seen_inodes is not None and not seen_inodes.add(stat):
+                        continue
+
+                    total_size += _disk_usage(stat)
+
+                if entry.is_dir():
+                    if not _is_link(entry):
+                        stack.append(entry.path)
+                    continue
 
-    return []
+                if not disk_usage:
+                    # a linked file is freed as the link, not its target
+                    total_size += entry.stat(follow_symlinks=False).st_size
+            except OSError as e:
+                if raises:
+                    log.error(e)
+                    raise e
 
+                log.warning(e)
 
-def calculate_size(dir: Path, raises=False) -> float:
+    return total_size
+
+
+def calculate_size(
+    dir: Path, raises=False, disk_usage=False, seen_inodes: InodeSet | None = None
+) -> float:
     """
     Calculate the size of the given directory in MB.
+
+    With `disk_usage` the space that deleting the directory would free is
+    returned instead, hardlinked files are only counted the first time
+    they are added to `seen_inodes`.
     """
     if not dir.exists() or not dir.is_dir():
         raise FileNotFoundError(f"Directory {dir} does not exist")
 
-    total_size = 0.0
+    size = _calculate_size(
+        str(dir), raises=raises, disk_usage=disk_usage, seen_inodes=seen_inodes
+    )
 
-    for root, _, files in os.walk(dir):
-        for file in files:
-            total_size += os.path.getsize(os.path.join(root, file))
+    return size / 1024 / 1024
 
-    return total_size / 1024 / 1024
+
+def count_entries(dir: Path) -> int:
+    """
+    Number of entries directly in `dir`, a cheap hint of its size.
+    Return 0 when it can not be read.
+    """
+    try:
+        with os.scandir(dir) as it:
+            return sum(1 for _ in it)
+    except OSError:
+        return 0
+
+
+# files whose modification time tells when a project was last worked on,
+# relative to the project folder
+ACTIVITY_FILES = (
+    "package.json",
+    *LOCKFILES,
+    os.path.join(".git", "HEAD"),
+    os.path.join(".git", "index"),
+    *(os.path.join(NODE_MODULES, name) for name in NODE_MODULES_MARKERS),
+)
 
 
-def remove_node_modules(dir: Path) -> None:
+def last_activity(dir: Path) -> float | None:
     """
-    Remove the node_modules folder from the given directory.
+    Time of the last activity in the project `dir`, the newest modification
+    time of a handful of files in it (`ACTIVITY_FILES`), so node_modules
+    itself is never walked.
+    Return None when it has none of them.
+    """
+    mtimes = []
+
+    for name in ACTIVITY_FILES:
+        try:
+            mtimes.append(os.stat(os.path.join(dir, name)).st_mtime)
+        except OSError:
+            continue
+
+    return max(mtimes, default=None)
+
+
+def format_age(timestamp: float | None, now: float | None = None) -> str:
+    """
+    Short human readable time since `timestamp`, like "5d" or "2y".
+    """
+    if timestamp is None:
+        return "?"
+
+    seconds = max((now or time.time()) - timestamp, 0)
+
+    for unit, unit_seconds in (
+        ("y", 365 * 24 * 60 * 60),
+        ("mo", 30 * 24 * 60 * 60),
+        ("d", 24 * 60 * 60),
+        ("h", 60 * 60),
+        ("m", 60),
+    ):
+        if seconds >= unit_seconds:
+            return f"{int(seconds // unit_seconds)}{unit}"
+
+    return "now"
+
+
+# least number of packages whose size is calculated for an estimate
+ESTIMATE_SAMPLES = 32
+# more packages are sampled until the standard error of the estimate is
+# below this fraction of it, which puts most estimates within 10%
+ESTIMATE_ERROR = 0.05
+
+
+def _estimate_entries(dir: str, disk_usage: bool) -> tuple[list[str], int]:
+    """
+    Split the node_modules folder `dir` into the package folders an
+    estimate samples from, including scoped packages and the packages in
+    .pnpm, and the size in bytes of everything else, which is calculated
+    right away.
+    """
+    packages: list[str] = []
+    other_size = 0
+
+    with os.scandir(dir) as it:
+        entries = list(it)
+
+    for entry in entries:
+        if not entry.is_dir():
+            stat = entry.stat(follow_symlinks=False)
+            other_size += _disk_usage(stat) if disk_usage else stat.st_size
+            continue
+
+        if _is_link(entry):
+            continue
+
+        if entry.name.startswith("@") or entry.name == ".pnpm":
+            scoped, scoped_size = _estimate_entries(entry.path, disk_usage)
+            packages += scoped
+            other_size += scoped_size
+        elif entry.name.startswith("."):
+            # .bin, .cache and the like
+            other_size += _calculate_size(entry.path, disk_usage=disk_usage)
+        else:
+            packages.append(entry.path)
+
+    return packages, other_size
+
+
+def estimate_size(
+    dir: Path, samples: int = ESTIMATE_SAMPLES, disk_usage=False
+) -> float | None:
+    """
+    Estimate the size of the node_modules folder `dir` in MB from the sizes
+    of randomly chosen packages in it, at least `samples` of them and at
+    most a quarter.
+    Return None when it has so few packages that calculating the exact size
+    is about as quick.
+    """
+    packages, other_size = _estimate_entries(str(dir), disk_usage)
+
+    if len(packages) <= samples * 4:
+        return None
+
+    random.Random(str(dir)).shuffle(packages)
+
+    # running mean and variance of the package sizes (Welford)
+    count, mean, m2 = 0, 0.0, 0.0
+
+    for package in packages[: len(packages) // 4]:
+        size = _calculate_size(package, disk_usage=disk_usage)
+
+        count += 1
+        delta = size - mean
+        mean += delta / count
+        m2 += delta * (size - mean)
+
+        if count >= samples and mean > 0:
+            error = (m2 / (count - 1) / count) ** 0.5
+
+            if error <= ESTIMATE_ERROR * mean:
+                break
+
+    size = other_size + mean * len(packages)
+
+    return size / 1024 / 1024
+
+
+def remove_node_modules(
+    dir: Path,
+    jobs: int = 1,
+    on_progress: ProgressCallback | None = None,
+    members: typing.Sequence[Path] = (),
+) -> RemoveProgress:
+    """
+    Remove the node_modules folder from the given directory, and from the
+    workspace `members` of it that still have one.
+    The files are removed by `jobs` threads, `on_progress` is called with
+    the number of files and bytes removed as the removal goes on.
     """
     node_modules_dir = dir / NODE_MODULES
 
     if not node_modules_dir.exists():
         raise ValueError(f"Directory {dir} does not contain a {NODE_MODULES} folder")
 
-    shutil.rmtree(node_modules_dir)
+    progress = remove_tree(str(node_modules_dir), jobs=jobs, on_progress=on_progress)
+
+    for member in members:
+        if not (member / NODE_MODULES).exists():
+            continue
+
+        member_progress = remove_tree(
+            str(member / NODE_MODULES), jobs=jobs, on_progress=on_progress
+        )
+        progress.files += member_progress.files
+        progress.bytes += member_progress.bytes
+
+    return progress
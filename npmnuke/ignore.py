@@ -0,0 +1,136 @@
+import re
+import typing
+
+
+def translate_glob(pattern: str) -> str:
+    """
+    Translate a gitignore glob to a regular expression for a path relative
+    to the scanned directory, with "/" separators.
+    """
+    anchored = "/" in pattern
+
+    if pattern.startswith("/"):
+        pattern = pattern[1:]
+
+    regex = ""
+    i = 0
+
+    while i < len(pattern):
+        c = pattern[i]
+
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            # any number of directories, including none
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == len(pattern):
+            regex += ".*"
+            i += 2
+        elif c == "*":
+            regex += "[^/]*"
+            i += 1
+        elif c == "?":
+            regex += "[^/]"
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+
+            if end == -1:
+                regex += re.escape(c)
+                i += 1
+                continue
+
+            content = pattern[i + 1 : end]
+            if content.startswith("!"):
+                content = "^" + content[1:]
+
+            regex += f"[{content.replace(chr(92), chr(92) * 2)}]"
+            i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(c)
+            i += 1
+
+    if not anchored:
+        # a plain name matches at any depth
+        regex = "(?:.*/)?" + regex
+
+    return regex
+
+
+class IgnoreMatcher:
+    """
+    Directories to skip, described by gitignore patterns: globs, paths
+    anchored to the scanned directory when they contain a "/", and "!" to
+    include a directory again. Blank lines and "#" comments are skipped.
+
+    All patterns are compiled into a single regular expression, so each
+    directory is checked with one match. Patterns are ordered last first,
+    so the alternative that matches is the one that decides, like in git.
+    """
+
+    def __init__(self, patterns: typing.Iterable[str]) -> None:
+        self.patterns: list[str] = []
+        self._negated: typing.Dict[str, bool] = {}
+        # plain names, checked with a set lookup when nothing is negated
+        self._names: typing.Set[str] = set()
+
+        alternatives = []
+
+        for line in patterns:
+            pattern = line.rstrip("\n")
+
+            if not pattern.strip() or pattern.startswith("#"):
+                continue
+
+            # trailing spaces are ignored unless escaped
+            if not pattern.endswith("\\ "):
+                pattern = pattern.rstrip()
+
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:]
+            elif pattern.startswith(("\\!", "\\#")):
+                pattern = pattern[1:]
+
+            # only directories are matched, so a trailing "/" changes nothing
+            pattern = pattern.rstrip("/")
+
+            if not pattern:
+                continue
+
+            self.patterns.append(line)
+
+            group = f"p{len(alternatives)}"
+            self._negated[group] = negated
+            alternatives.append(f"(?P<{group}>{translate_glob(pattern)})")
+
+            if not negated and not re.search(r"[/*?\[\\]", pattern):
+                self._names.add(pattern)
+
+        self._has_negation = any(self._negated.values())
+        self._regex = (
+            re.compile("|".join(reversed(alternatives))) if alternatives else None
+        )
+
+    def __bool__(self) -> bool:
+        return self._regex is not None
+
+    def match(self, relative_path: str, name: str) -> bool:
+        """
+        Whether the directory `name` at `relative_path`, relative to the
+        scanned directory with "/" separators, is ignored.
+        """
+        if self._regex is None:
+            return False
+
+        if not self._has_negation and name in self._names:
+            return True
+
+        match = self._regex.fullmatch(relative_path)
+
+        if match is None:
+            return False
+
+        return not self._negated[match.lastgroup]
@@ -1,15 +1,14 @@
 import argparse
 import logging
+import os
 import sys
 from datetime import datetime
 from pathlib import Path
 
-import click
-
-from npmnuke.app import NPMNuke
-from npmnuke.cli import non_interactive_dialog
+from npmnuke.ignore import IgnoreMatcher
 from npmnuke.logger import log
-from npmnuke.models import DialogSettings
+from npmnuke.models import CleanupPolicy, DialogSettings
+from npmnuke.mounts import DEFAULT_SKIP_FS_TYPES
 
 
 def main() -> None:
@@ -49,14 +48,84 @@ def main() -> None:
 
         if ignore_file:
             with open(ignore_file, "r") as f:
-                ignore_set = set(f.read().splitlines())
+                ignore_set = IgnoreMatcher(f.read().splitlines())
 
             log.debug(f"Using ignore file {ignore_file}")
 
     if args.ignore_dot:
         log.debug("Ignoring dot folders")
 
-    if args.dry_run:
+    if args.disk_usage and args.size_cache:
+        # hardlinks are deduplicated per run, so these sizes can not be reused
+        log.warning("--size-cache is ignored with --disk-usage")
+        args.size_cache = False
+
+    if args.fps < 1:
+        log.error(f"Frame rate must be at least 1, got {args.fps}")
+        sys.exit(1)
+
+    if args.jobs < 1:
+        log.error(f"Number of jobs must be at least 1, got {args.jobs}")
+        sys.exit(1)
+
+    if args.size_jobs < 1:
+        log.error(f"Number of size jobs must be at least 1, got {args.size_jobs}")
+        sys.exit(1)
+
+    if args.remove_jobs < 1:
+        log.error(f"Number of remove jobs must be at least 1, got {args.remove_jobs}")
+        sys.exit(1)
+
+    if args.max_depth is not None and args.max_depth < 0:
+        log.error(f"Maximum depth can not be negative, got {args.max_depth}")
+        sys.exit(1)
+
+    if args.time_budget is not None and args.time_budget <= 0:
+        log.error(f"Time budget must be positive, got {args.time_budget}")
+        sys.exit(1)
+
+    policy = None
+    thresholds = (args.min_size, args.older_than, args.max_total)
+
+    # 0 is a valid threshold, so they are compared with None
+    if args.all or any(threshold is not None for threshold in thresholds):
+        policy = CleanupPolicy(
+            select_all=args.all,
+            min_size=args.min_size,
+            older_than=args.older_than,
+            max_total=args.max_total,
+        )
+
+    if policy and args.format != "text":
+        log.error("--format can not be combined with an unattended cleanup")
+        sys.exit(1)
+
+    if (
+        policy
+        and args.skip_calculating_size
+        and (args.min_size is not None or args.max_total is not None)
+    ):
+        log.error("--min-size and --max-total need the folder sizes")
+        sys.exit(1)
+
+    if args.top is not None:
+        if args.top < 1:
+            log.error(f"Number of top folders must be at least 1, got {args.top}")
+            sys.exit(1)
+
+        if args.skip_calculating_size:
+            log.error("--top needs the folder sizes")
+            sys.exit(1)
+
+        if policy or args.format != "text":
+            log.error("--top can only be used with the dialogs")
+            sys.exit(1)
+
+    skip_fs_types = {fs_type for fs_type in args.skip_fs_types.split(",") if fs_type}
+
+    if args.dry_run and args.format == "text" and not policy:
+        import click
+
         log.debug("Dry run enabled")
         click.secho(
             "⚠️ Dry run enabled - node_modules folders will not be removed ⚠️",
@@ -71,15 +140,55 @@ def main() -> None:
         ignore_dot=args.ignore_dot,
         ignore_set=ignore_set,
         dry_run=args.dry_run,
+        jobs=args.jobs,
+        size_during_scan=args.size_during_scan,
+        size_jobs=args.size_jobs,
+        incremental=args.incremental,
+        size_cache=args.size_cache,
+        disk_usage=args.disk_usage,
+        remove_jobs=args.remove_jobs,
+        background_remove=args.background_remove,
+        fps=args.fps,
+        top=args.top,
+        size_order=args.size_order,
+        estimate_sizes=args.estimate_sizes,
+        workspaces=not args.no_workspaces,
+        one_file_system=args.one_file_system,
+        skip_fs_types=skip_fs_types,
+        follow_links=args.follow_links,
+        max_depth=args.max_depth,
+        time_budget=args.time_budget,
+        resume=args.resume,
     )
 
+    # the user interfaces are only imported when they are used, the
+    # ndjson output does not need any of them
     try:
-        if args.non_interactive:
+        if args.format == "ndjson":
+            from npmnuke.stream import ndjson_dialog
+
+            ndjson_dialog(dialog_settings)
+        elif policy:
+            from npmnuke.policy import unattended_dialog
+
+            unattended_dialog(dialog_settings, policy)
+        elif args.non_interactive:
+            from npmnuke.cli import non_interactive_dialog
+
             non_interactive_dialog(dialog_settings)
         else:
+            from npmnuke.app import NPMNuke
+
             NPMNuke(dialog_settings).run()
     except KeyboardInterrupt:
-        print("\nExiting...")
+        if args.format == "text" and not policy:
+            print("\nExiting...")
+    except BrokenPipeError:
+        # the reader of the output went away, e.g. `npmnuke --format ndjson | head`,
+        # stdout is pointed at devnull so flushing it on exit does not fail again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
 
 
 def get_args() -> argparse.Namespace:
@@ -96,6 +205,36 @@ def get_args() -> argparse.Namespace:
         help="do not start the interactive dialog (simplified command line interface)",
         default=False,
     )
+    parser.add_argument(
+        "--format",
+        choices=["text", "ndjson"],
+        help="output format, ndjson writes one JSON record per found folder to stdout and removes nothing, by default text",
+        default="text",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="remove every found node_modules folder without asking and print a JSON summary",
+        default=False,
+    )
+    parser.add_argument(
+        "--min-size",
+        type=float,
+        help="remove the node_modules folders of at least this many MB without asking",
+        default=None,
+    )
+    parser.add_argument(
+        "--older-than",
+        type=float,
+        help="remove the node_modules folders of projects without activity for this many days without asking",
+        default=None,
+    )
+    parser.add_argument(
+        "--max-total",
+        type=float,
+        help="stop an unattended cleanup once this many MB are reclaimed",
+        default=None,
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -109,6 +248,72 @@ def get_args() -> argparse.Namespace:
         help="skip calculating the size of the node_modules folders",
         default=False,
     )
+    parser.add_argument(
+        "--size-during-scan",
+        action="store_true",
+        help="calculate the size of each node_modules folder as soon as the scan finds it",
+        default=False,
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        help="only list the N largest node_modules folders",
+        default=None,
+    )
+    parser.add_argument(
+        "--size-order",
+        choices=["found", "entries"],
+        help="order in which folder sizes are calculated, entries starts with the folders with the most packages, by default found",
+        default="found",
+    )
+    parser.add_argument(
+        "--estimate-sizes",
+        action="store_true",
+        help="show a quick estimate of each folder size, sampled from some of its packages, until the exact size is calculated",
+        default=False,
+    )
+    parser.add_argument(
+        "--no-workspaces",
+        action="store_true",
+        help="list the node_modules folders of workspace packages separately instead of with their workspace root",
+        default=False,
+    )
+    parser.add_argument(
+        "--one-file-system",
+        action="store_true",
+        help="do not scan directories on other filesystems than the scanned directory",
+        default=False,
+    )
+    parser.add_argument(
+        "--skip-fs-types",
+        type=str,
+        help="comma separated filesystem types whose mount points are not scanned, e.g. nfs,cifs for network filesystems, by default pseudo filesystems (proc, sysfs, ...), pass an empty string to scan all",
+        default=",".join(DEFAULT_SKIP_FS_TYPES),
+    )
+    parser.add_argument(
+        "--follow-links",
+        action="store_true",
+        help="also scan linked directories, each directory is scanned once even when several links lead to it",
+        default=False,
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        help="only scan directories up to this many levels below the scanned directory",
+        default=None,
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="stop scanning after this many seconds and remember the directories left, continue with --resume",
+        default=None,
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the last scan of the directory that ran out of its --time-budget",
+        default=False,
+    )
     parser.add_argument(
         "--ignore-file",
         type=str,
@@ -127,12 +332,61 @@ def get_args() -> argparse.Namespace:
         help="ignore dot folders (.vscode/ .git/ etc.), by default True",
         default=True,
     )
+    parser.add_argument(
+        "--fps",
+        type=int,
+        help="frame rate of the spinners and the timer in the interactive dialog, by default 10",
+        default=10,
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="do not remove any folders",
         default=False,
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="number of threads used to scan directories, by default 1",
+        default=1,
+    )
+    parser.add_argument(
+        "--size-jobs",
+        type=int,
+        help="number of threads used to calculate folder sizes, by default 4",
+        default=4,
+    )
+    parser.add_argument(
+        "--remove-jobs",
+        type=int,
+        help="number of threads used to remove a node_modules folder, by default 4",
+        default=4,
+    )
+    parser.add_argument(
+        "--background-remove",
+        action="store_true",
+        help="move node_modules folders out of the way instantly and delete them in the background",
+        default=False,
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="keep a scan index in ~/.cache/npmnuke and only read directories that changed since the last scan",
+        default=False,
+    )
+    parser.add_argument(
+        "--size-cache",
+        action="store_true",
+        help="keep calculated sizes in ~/.cache/npmnuke and reuse them while the folder and its lockfiles are unchanged",
+        default=False,
+    )
+    parser.add_argument(
+        "--disk-usage",
+        action="store_true",
+        help="show the disk space freed by removing a folder, counting hardlinked files (pnpm) once",
+        default=False,
+    )
 
     return parser.parse_args()
 
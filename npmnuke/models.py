@@ -1,7 +1,10 @@
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
+if typing.TYPE_CHECKING:
+    from npmnuke.ignore import IgnoreMatcher
+
 IgnoreSet = typing.Set[str]
 
 
@@ -15,6 +18,22 @@ class NodeFolder:
     size: float | None = None
     size_calculated: bool = False
     removed: bool = False
+    # the size is an estimate until the exact size is calculated
+    approximate: bool = False
+    # newest modification time of the project files, see `last_activity`
+    last_activity: float | None = None
+    # workspace packages whose node_modules are part of this result
+    members: list[Path] = field(default_factory=list)
+
+
+@dataclass
+class RemoveProgress:
+    """
+    Number of files and bytes removed so far.
+    """
+
+    files: int = 0
+    bytes: int = 0
 
 
 @dataclass
@@ -27,5 +46,55 @@ class DialogSettings:
     verbose: bool = False
     skip_calculating_size: bool = False
     ignore_dot: bool = True
-    ignore_set: IgnoreSet | None = None
+    ignore_set: "IgnoreSet | IgnoreMatcher | None" = None
+    dry_run: bool = False
+    jobs: int = 1
+    size_during_scan: bool = False
+    size_jobs: int = 4
+    incremental: bool = False
+    size_cache: bool = False
+    disk_usage: bool = False
+    remove_jobs: int = 4
+    background_remove: bool = False
+    fps: int = 10
+    top: int | None = None
+    size_order: str = "found"
+    estimate_sizes: bool = False
+    workspaces: bool = True
+    one_file_system: bool = False
+    skip_fs_types: typing.Collection[str] = ()
+    follow_links: bool = False
+    max_depth: int | None = None
+    time_budget: float | None = None
+    resume: bool = False
+
+
+@dataclass
+class CleanupPolicy:
+    """
+    Which node_modules folders an unattended cleanup removes.
+
+    A folder is selected when it matches every filter that is set,
+    `max_total` stops the cleanup once that many MB are reclaimed.
+    """
+
+    select_all: bool = False
+    min_size: float | None = None
+    older_than: float | None = None
+    max_total: float | None = None
+
+
+@dataclass
+class CleanupSummary:
+    """
+    Outcome of an unattended cleanup.
+    """
+
+    found: int = 0
+    selected: int = 0
+    removed: int = 0
+    failed: int = 0
+    bytes: int = 0
     dry_run: bool = False
+    budget_reached: bool = False
+    elapsed: float = 0.0
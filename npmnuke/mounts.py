@@ -0,0 +1,96 @@
+import functools
+import os
+import re
+import typing
+
+from npmnuke.logger import log
+
+MOUNTS_FILE = "/proc/self/mounts"
+
+# pseudo filesystems of the kernel without projects, their mount points are
+# not scanned. Network filesystems are scanned unless asked otherwise, they
+# often hold the home directories the projects are in.
+DEFAULT_SKIP_FS_TYPES = (
+    "binfmt_misc",
+    "bpf",
+    "cgroup",
+    "cgroup2",
+    "configfs",
+    "debugfs",
+    "devpts",
+    "devtmpfs",
+    "efivarfs",
+    "fusectl",
+    "hugetlbfs",
+    "mqueue",
+    "nsfs",
+    "proc",
+    "pstore",
+    "rpc_pipefs",
+    "securityfs",
+    "selinuxfs",
+    "sysfs",
+    "tracefs",
+)
+
+
+def _unescape(field: str) -> str:
+    # spaces, tabs, newlines and backslashes are written as octal escapes
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+
+
+@functools.lru_cache(maxsize=None)
+def read_mounts(path: str = MOUNTS_FILE) -> tuple[tuple[str, str], ...]:
+    """
+    Return the mount point and filesystem type of every mount, read once
+    per process. Empty where there is no mount table, e.g. not on Linux.
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="surrogateescape") as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        log.debug(f"Could not read {path}: {e}")
+        return ()
+
+    mounts = []
+
+    for line in lines:
+        fields = line.split()
+
+        if len(fields) >= 3:
+            mounts.append((_unescape(fields[1]), fields[2]))
+
+    return tuple(mounts)
+
+
+def skipped_mount_points(
+    target_dir: str,
+    fs_types: typing.Collection[str],
+    mounts: typing.Iterable[tuple[str, str]] | None = None,
+) -> typing.Set[str]:
+    """
+    Return the mount points below `target_dir` whose filesystem type is in
+    `fs_types`, spelled the way a scan of `target_dir` reaches them.
+    """
+    if not fs_types:
+        return set()
+
+    if mounts is None:
+        mounts = read_mounts()
+
+    root = os.path.abspath(target_dir)
+    skipped: typing.Set[str] = set()
+
+    # a later mount on the same mount point hides the earlier ones
+    fs_type_by_mount_point = dict(mounts)
+
+    for mount_point, fs_type in fs_type_by_mount_point.items():
+        if fs_type not in fs_types or mount_point == root:
+            continue
+
+        if os.path.commonpath([root, mount_point]) != root:
+            continue
+
+        skipped.add(os.path.join(target_dir, os.path.relpath(mount_point, root)))
+
+    return skipped
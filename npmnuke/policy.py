@@ -0,0 +1,126 @@
+import dataclasses
+import json
+import sys
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from npmnuke.files import NODE_MODULES, remove_node_modules
+from npmnuke.logger import log
+from npmnuke.models import CleanupPolicy, CleanupSummary, DialogSettings, NodeFolder
+from npmnuke.stream import stream_node_folders
+from npmnuke.tombstone import Reaper
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def selected(policy: CleanupPolicy, node_folder: NodeFolder, now: float) -> bool:
+    """
+    Whether `policy` selects `node_folder` for removal. A policy without
+    any filter selects nothing, projects whose last activity is unknown are
+    never old enough.
+    """
+    if policy.min_size is not None:
+        if node_folder.size is None or node_folder.size < policy.min_size:
+            return False
+
+    if policy.older_than is not None:
+        activity = node_folder.last_activity
+
+        if activity is None or now - activity < policy.older_than * SECONDS_PER_DAY:
+            return False
+
+    return (
+        policy.select_all
+        or policy.min_size is not None
+        or policy.older_than is not None
+        or policy.max_total is not None
+    )
+
+
+def unattended_cleanup(
+    options: DialogSettings, policy: CleanupPolicy, reaper: Reaper | None = None
+) -> CleanupSummary:
+    """
+    Remove every node_modules folder `policy` selects, without asking.
+
+    Scanning, sizing and removing run as a pipeline, a folder is removed
+    while the scan goes on. With a `reaper` the folders are moved to
+    tombstones and deleted in the background instead.
+    """
+    start = time.monotonic()
+    now = time.time()
+    summary = CleanupSummary(dry_run=options.dry_run)
+    reclaimed_mb = 0.0
+
+    def remove(node_folder: NodeFolder) -> int:
+        if reaper is not None:
+            for project in (node_folder.path, *node_folder.members):
+                reaper.bury(project / NODE_MODULES)
+            return 0
+
+        progress = remove_node_modules(
+            node_folder.path, jobs=options.remove_jobs, members=node_folder.members
+        )
+        log.debug(f"Removed {progress.files} files, {progress.bytes} bytes")
+
+        return progress.bytes
+
+    # the removals run one after another, each one with its own threads
+    removals: list[tuple[NodeFolder, Future[int]]] = []
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for node_folder, _, _ in stream_node_folders(options):
+            summary.found += 1
+
+            if not selected(policy, node_folder, now):
+                continue
+
+            summary.selected += 1
+            reclaimed_mb += node_folder.size or 0.0
+
+            log.debug(f"Selected {node_folder.path}")
+
+            if not options.dry_run:
+                removals.append((node_folder, executor.submit(remove, node_folder)))
+
+            if policy.max_total is not None and reclaimed_mb >= policy.max_total:
+                summary.budget_reached = True
+                break
+
+    for node_folder, removal in removals:
+        try:
+            removed_bytes = removal.result()
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not remove {node_folder.path}: {e}")
+            summary.failed += 1
+            continue
+
+        summary.removed += 1
+
+        if node_folder.size is None:
+            summary.bytes += removed_bytes
+        else:
+            summary.bytes += round(node_folder.size * 1024 * 1024)
+
+    if options.dry_run:
+        summary.bytes = round(reclaimed_mb * 1024 * 1024)
+
+    summary.elapsed = round(time.monotonic() - start, 6)
+
+    return summary
+
+
+def unattended_dialog(
+    options: DialogSettings, policy: CleanupPolicy, out: typing.TextIO = sys.stdout
+) -> None:
+    """
+    Run an unattended cleanup and write its summary to `out` as JSON.
+    """
+    with Reaper(jobs=options.remove_jobs) as reaper:
+        summary = unattended_cleanup(
+            options, policy, reaper if options.background_remove else None
+        )
+
+    out.write(json.dumps(dataclasses.asdict(summary)) + "\n")
+    out.flush()
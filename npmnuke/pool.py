@@ -0,0 +1,315 @@
+import collections
+import heapq
+import itertools
+import threading
+import typing
+from concurrent.futures import Future
+from pathlib import Path
+
+from npmnuke.cache import SizeCache, size_fingerprint
+from npmnuke.files import (
+    NODE_MODULES,
+    InodeSet,
+    calculate_size,
+    count_entries,
+    estimate_size,
+)
+from npmnuke.logger import log
+
+# lower values are calculated first
+PRIORITY_HIGHLIGHTED = 0
+PRIORITY_VISIBLE = 1
+PRIORITY_NORMAL = 2
+
+
+class SizePool:
+    """
+    Calculate sizes of node_modules folders on a fixed number of threads.
+
+    Folders are taken from a priority queue, folders submitted with the same
+    priority are calculated in submission order, or with `size_order`
+    "entries" the folders with the most packages first. The priority of a
+    waiting folder can be raised with `prioritize`.
+
+    Quick estimates queued with `estimate` are calculated before any exact
+    size, and by a thread of their own as well, so they never wait for the
+    exact sizes that are being calculated.
+
+    With a `cache`, folders with a cached size are resolved right away.
+    With `disk_usage` the reclaimable size is calculated, with hardlinked
+    files counted once across all folders of the pool.
+    """
+
+    def __init__(
+        self,
+        jobs: int = 4,
+        cache: SizeCache | None = None,
+        disk_usage=False,
+        size_order="found",
+    ) -> None:
+        self._jobs = max(jobs, 1)
+        self._size_order = size_order
+        self._cache = cache
+        self._disk_usage = disk_usage
+        self._seen_inodes = InodeSet() if disk_usage else None
+        self._heap: list[tuple[int, int, int, Path]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._shutdown = False
+
+        # futures of folders that are waiting in the queue
+        self._waiting: typing.Dict[Path, tuple[int, int, Future[float]]] = {}
+        self._futures: typing.Dict[Path, Future[float]] = {}
+        # workspace members whose node_modules are counted with a folder
+        self._members: typing.Dict[Path, typing.Sequence[Path]] = {}
+        self._estimates: collections.deque[
+            tuple[Path, Future[float | None]]
+        ] = collections.deque()
+
+        self._threads: list[threading.Thread] = []
+        self._estimate_thread: threading.Thread | None = None
+
+    def __enter__(self) -> "SizePool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+    def submit(
+        self,
+        path: Path,
+        priority: int = PRIORITY_NORMAL,
+        members: typing.Sequence[Path] = (),
+    ) -> Future[float]:
+        """
+        Queue the size calculation of the node_modules folder in `path`,
+        together with the ones of its workspace `members`.
+        The future resolves to the size in MB.
+        """
+        size = None
+        if self._cache is not None:
+            size = self._cache.get(path, size_fingerprint(path, members))
+
+        # reads the folder, so it is done before taking the lock as well
+        order = self._order(path) if size is None else 0
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit to a pool that is shut down")
+
+            if path in self._futures:
+                self._push(path, priority)
+                return self._futures[path]
+
+            future: Future[float] = Future()
+            self._futures[path] = future
+
+            if members:
+                self._members[path] = members
+
+            if size is not None:
+                future.set_running_or_notify_cancel()
+                future.set_result(size)
+                return future
+
+            self._waiting[path] = (priority, order, future)
+            heapq.heappush(self._heap, (priority, order, next(self._counter), path))
+
+            self._start_thread()
+            # the estimate thread does not take exact sizes, so all are woken
+            self._condition.notify_all()
+
+            return future
+
+    def estimate(self, path: Path) -> Future[float | None]:
+        """
+        Queue a quick estimate of the size of the node_modules folder in
+        `path`. The future resolves to the estimated size in MB, or to None
+        when the folder is small enough that no estimate is made.
+        """
+        future: Future[float | None] = Future()
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit to a pool that is shut down")
+
+            if path in self._members:
+                # workspaces are not estimated
+                future.set_running_or_notify_cancel()
+                future.set_result(None)
+                return future
+
+            self._estimates.append((path, future))
+
+            self._start_estimate_thread()
+            self._condition.notify_all()
+
+        return future
+
+    def prioritize(self, path: Path, priority: int = PRIORITY_HIGHLIGHTED) -> None:
+        """
+        Raise the priority of a folder that is still waiting to be calculated.
+        """
+        with self._condition:
+            self._push(path, priority)
+
+    def map(
+        self, paths: typing.Iterable[Path], priority: int = PRIORITY_NORMAL
+    ) -> typing.Iterator[float]:
+        """
+        Calculate the sizes of all `paths` and yield them in the same order.
+        """
+        futures = [self.submit(path, priority) for path in paths]
+
+        for future in futures:
+            yield future.result()
+
+    def shutdown(self, wait=True) -> None:
+        """
+        Stop the workers. Folders that are still waiting are cancelled.
+        """
+        with self._condition:
+            self._shutdown = True
+
+            for _, _, future in self._waiting.values():
+                future.cancel()
+
+            for _, estimate in self._estimates:
+                estimate.cancel()
+
+            self._waiting.clear()
+            self._estimates.clear()
+            self._heap.clear()
+            self._condition.notify_all()
+
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+            if self._estimate_thread is not None:
+                self._estimate_thread.join()
+
+    def _push(self, path: Path, priority: int) -> None:
+        if path not in self._waiting:
+            # already calculated or being calculated
+            return
+
+        current_priority, order, future = self._waiting[path]
+
+        if priority >= current_priority:
+            return
+
+        # the old heap entry becomes stale and is skipped by the workers
+        self._waiting[path] = (priority, order, future)
+        heapq.heappush(self._heap, (priority, order, next(self._counter), path))
+        self._condition.notify_all()
+
+    def _order(self, path: Path) -> int:
+        if self._size_order == "entries":
+            # folders with more packages are likely larger
+            return -count_entries(path / NODE_MODULES)
+
+        return 0
+
+    def _start_thread(self) -> None:
+        if len(self._threads) >= self._jobs or len(self._threads) >= len(self._waiting):
+            return
+
+        thread = threading.Thread(
+            target=self._worker,
+            name=f"npmnuke-size-{len(self._threads)}",
+            daemon=True,
+        )
+        self._threads.append(thread)
+        thread.start()
+
+    def _start_estimate_thread(self) -> None:
+        if self._estimate_thread is not None:
+            return
+
+        self._estimate_thread = threading.Thread(
+            target=self._worker, args=(True,), name="npmnuke-estimate", daemon=True
+        )
+        self._estimate_thread.start()
+
+    def _next(self, estimates_only=False) -> tuple[Path, Future, bool] | None:
+        """
+        Wait for the next folder to calculate, return it with its future
+        and whether only an estimate is asked for.
+        """
+        with self._condition:
+            while True:
+                if self._estimates:
+                    path, estimate = self._estimates.popleft()
+                    return path, estimate, True
+
+                while self._heap and not estimates_only:
+                    priority, _, _, path = heapq.heappop(self._heap)
+
+                    waiting = self._waiting.get(path)
+                    if waiting is None or waiting[0] != priority:
+                        continue
+
+                    del self._waiting[path]
+                    return path, waiting[2], False
+
+                if self._shutdown:
+                    return None
+
+                self._condition.wait()
+
+    def _worker(self, estimates_only=False) -> None:
+        while True:
+            item = self._next(estimates_only)
+
+            if item is None:
+                return
+
+            path, future, estimate = item
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            if estimate:
+                self._estimate(path, future)
+                continue
+
+            log.debug(f"Calculating size of {path}")
+
+            members = self._members.get(path, ())
+
+            try:
+                fingerprint = None
+                if self._cache is not None:
+                    fingerprint = size_fingerprint(path, members)
+
+                size = sum(
+                    calculate_size(
+                        project / NODE_MODULES,
+                        disk_usage=self._disk_usage,
+                        seen_inodes=self._seen_inodes,
+                    )
+                    for project in (path, *members)
+                )
+
+                if self._cache is not None:
+                    self._cache.set(path, fingerprint, size)
+
+                future.set_result(size)
+            except Exception as e:
+                log.warning(e)
+                future.set_exception(e)
+
+            log.debug(f"Finished calculating size of {path}")
+
+    def _estimate(self, path: Path, future: Future[float | None]) -> None:
+        log.debug(f"Estimating size of {path}")
+
+        try:
+            # hardlinks are not deduplicated, the exact size takes care of it
+            future.set_result(
+                estimate_size(path / NODE_MODULES, disk_usage=self._disk_usage)
+            )
+        except Exception as e:
+            log.warning(e)
+            future.set_exception(e)
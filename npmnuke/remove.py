@@ -0,0 +1,238 @@
+import os
+import shutil
+import threading
+import time
+import typing
+
+from npmnuke.logger import log
+from npmnuke.models import RemoveProgress
+
+# called with the number of files and bytes removed since the last call
+ProgressCallback = typing.Callable[[int, int], None]
+
+_DIR_FD_FUNCTIONS = {os.open, os.unlink, os.rmdir}
+_SUPPORTS_DIR_FD = (
+    _DIR_FD_FUNCTIONS <= os.supports_dir_fd and os.scandir in os.supports_fd
+)
+
+_OPEN_FLAGS = (
+    os.O_RDONLY
+    | getattr(os, "O_DIRECTORY", 0)
+    | getattr(os, "O_NOFOLLOW", 0)
+    | getattr(os, "O_CLOEXEC", 0)
+)
+
+
+class ProgressTotal:
+    """
+    Running total of a removal, to pass as `on_progress`, which is called
+    from several threads. `report` is called with the totals at most every
+    `interval` seconds.
+    """
+
+    def __init__(
+        self, report: typing.Callable[[RemoveProgress], None], interval: float
+    ) -> None:
+        self._report = report
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._reported: float | None = None
+
+        self.progress = RemoveProgress()
+
+    def __call__(self, files: int, bytes: int) -> None:
+        with self._lock:
+            self.progress.files += files
+            self.progress.bytes += bytes
+
+            now = time.monotonic()
+            if self._reported is not None and now - self._reported < self._interval:
+                return
+
+            self._reported = now
+            self._report(RemoveProgress(self.progress.files, self.progress.bytes))
+
+
+class _Dir:
+    """
+    A directory that is being removed. It is removed itself once its own
+    entries and all of its subdirectories are gone.
+    """
+
+    __slots__ = ("parent", "name", "path", "fd", "pending")
+
+    def __init__(self, parent: "_Dir | None", name: str, path: str) -> None:
+        self.parent = parent
+        self.name = name
+        self.path = path
+        self.fd = -1
+        # own entries plus one for every subdirectory
+        self.pending = 1
+
+
+class _TreeRemover:
+    """
+    Remove a directory tree with a pool of threads. Directories are opened
+    relative to their parent's file descriptor and files are unlinked
+    relative to their directory, so no path is resolved more than once.
+    """
+
+    def __init__(self, path: str, on_progress: ProgressCallback | None) -> None:
+        self._root = _Dir(None, os.path.basename(path), path)
+        self._on_progress = on_progress
+
+        self._stack: list[_Dir] = [self._root]
+        self._open: typing.Set[_Dir] = set()
+        self._condition = threading.Condition()
+        self._finished = False
+        self._error: OSError | None = None
+
+        self.progress = RemoveProgress()
+
+    def run(self, jobs: int) -> RemoveProgress:
+        if jobs > 1:
+            threads = [
+                threading.Thread(
+                    target=self._worker, name=f"npmnuke-remove-{i}", daemon=True
+                )
+                for i in range(jobs)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            self._worker()
+
+        # only left open when removing failed
+        for node in self._open:
+            os.close(node.fd)
+        self._open.clear()
+
+        if self._error is not None:
+            raise self._error
+
+        return self.progress
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stack and not self._finished:
+                    self._condition.wait()
+
+                if self._finished:
+                    return
+
+                node = self._stack.pop()
+
+            try:
+                self._remove_entries(node)
+                self._release(node)
+            except OSError as e:
+                log.error(e)
+
+                with self._condition:
+                    if self._error is None:
+                        self._error = e
+
+                    self._finished = True
+                    self._condition.notify_all()
+
+                return
+
+    def _remove_entries(self, node: _Dir) -> None:
+        if node.parent is None:
+            fd = os.open(node.path, _OPEN_FLAGS)
+        else:
+            try:
+                fd = os.open(node.name, _OPEN_FLAGS, dir_fd=node.parent.fd)
+            except FileNotFoundError:
+                # removed by someone else in the meantime
+                return
+
+        with self._condition:
+            node.fd = fd
+            self._open.add(node)
+
+        with os.scandir(fd) as it:
+            entries = list(it)
+
+        subdirs: list[_Dir] = []
+        files = 0
+        size = 0
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    path = os.path.join(node.path, entry.name)
+                    subdirs.append(_Dir(node, entry.name, path))
+                    continue
+
+                size += entry.stat(follow_symlinks=False).st_size
+                os.unlink(entry.name, dir_fd=fd)
+            except FileNotFoundError:
+                # removed by someone else in the meantime
+                continue
+
+            files += 1
+
+        with self._condition:
+            node.pending += len(subdirs)
+            self._stack.extend(subdirs)
+            self._condition.notify(len(subdirs))
+
+            self.progress.files += files
+            self.progress.bytes += size
+
+        if self._on_progress is not None and files:
+            self._on_progress(files, size)
+
+    def _release(self, node: _Dir | None) -> None:
+        """
+        Mark one pending part of `node` as done and remove every directory
+        on the way up that has nothing left in it.
+        """
+        while node is not None:
+            with self._condition:
+                node.pending -= 1
+
+                if node.pending > 0:
+                    return
+
+                self._open.discard(node)
+
+            if node.fd != -1:
+                os.close(node.fd)
+
+            try:
+                if node.parent is None:
+                    os.rmdir(node.path)
+                else:
+                    os.rmdir(node.name, dir_fd=node.parent.fd)
+            except FileNotFoundError:
+                # removed by someone else in the meantime
+                pass
+
+            if node.parent is None:
+                with self._condition:
+                    self._finished = True
+                    self._condition.notify_all()
+
+            node = node.parent
+
+
+def remove_tree(
+    path: str, jobs: int = 1, on_progress: ProgressCallback | None = None
+) -> RemoveProgress:
+    """
+    Remove the directory `path` with everything in it, using `jobs` threads.
+    Links are removed, never followed.
+
+    Where directory file descriptors are not supported (Windows) this falls
+    back to `shutil.rmtree` and no progress is reported.
+    """
+    if not _SUPPORTS_DIR_FD:
+        shutil.rmtree(path)
+        return RemoveProgress()
+
+    return _TreeRemover(path, on_progress).run(max(jobs, 1))
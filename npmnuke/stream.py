@@ -0,0 +1,121 @@
+import collections
+import json
+import sys
+import time
+import typing
+from concurrent.futures import Future
+
+from npmnuke.cache import ScanFrontier, ScanIndex, SizeCache
+from npmnuke.files import scan_kwargs, scan_node_modules_dirs
+from npmnuke.models import DialogSettings, NodeFolder
+from npmnuke.pool import SizePool
+
+# folders whose size is calculated ahead of the one that is written next,
+# for every size job
+_SIZES_AHEAD = 4
+
+
+def _record(node_folder: NodeFolder, found: float, sized: float | None) -> str:
+    return json.dumps(
+        {
+            "path": str(node_folder.path),
+            "size": node_folder.size,
+            "last_activity": node_folder.last_activity,
+            "members": [str(member) for member in node_folder.members],
+            "found": round(found, 6),
+            "sized": None if sized is None else round(sized, 6),
+        }
+    )
+
+
+def stream_node_folders(
+    options: DialogSettings,
+) -> typing.Iterator[tuple[NodeFolder, float, float | None]]:
+    """
+    Scan for node_modules folders and yield each one as soon as it is found
+    and its size is known, in the order they are found.
+
+    Together with each folder the seconds since the start of the scan at
+    which it was found and sized are yielded, sized is None when sizes are
+    not calculated. Only a bounded number of sizes are calculated ahead of
+    the folder that is yielded next.
+    """
+    start = time.monotonic()
+
+    size_during_scan = options.size_during_scan and not options.skip_calculating_size
+    size_in_pool = not options.skip_calculating_size and not size_during_scan
+
+    index = ScanIndex.load(options.target_dir) if options.incremental else None
+    frontier = (
+        ScanFrontier.load(options.target_dir, resume=options.resume)
+        if options.time_budget is not None or options.resume
+        else None
+    )
+    size_cache = SizeCache.load() if options.size_cache else None
+
+    pool = (
+        SizePool(
+            jobs=options.size_jobs, cache=size_cache, disk_usage=options.disk_usage
+        )
+        if size_in_pool
+        else None
+    )
+    in_flight: collections.deque[
+        tuple[NodeFolder, float, Future[float]]
+    ] = collections.deque()
+    ahead = options.size_jobs * _SIZES_AHEAD
+
+    def next_sized() -> tuple[NodeFolder, float, float]:
+        node_folder, found, future = in_flight.popleft()
+        node_folder.size = future.result()
+        node_folder.size_calculated = True
+
+        return node_folder, found, time.monotonic() - start
+
+    try:
+        for node_folder in scan_node_modules_dirs(
+            options.target_dir,
+            **scan_kwargs(
+                options, index=index, size_cache=size_cache, frontier=frontier
+            ),
+        ):
+            found = time.monotonic() - start
+
+            if pool is None:
+                yield node_folder, found, found if size_during_scan else None
+                continue
+
+            future = pool.submit(node_folder.path, members=node_folder.members)
+            in_flight.append((node_folder, found, future))
+
+            while in_flight and (in_flight[0][2].done() or len(in_flight) > ahead):
+                yield next_sized()
+
+        while in_flight:
+            yield next_sized()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+        if index is not None:
+            index.save()
+
+        if frontier is not None:
+            frontier.save()
+
+        if size_cache is not None:
+            size_cache.save()
+
+
+def ndjson_dialog(options: DialogSettings, out: typing.TextIO = sys.stdout) -> None:
+    """
+    Write one JSON record per found node_modules folder to `out` as soon as
+    it is found and its size is known. Nothing is removed.
+
+    `found` and `sized` are the seconds since the start of the scan at which
+    the folder was found and its size was known. `size` is in MB and null
+    when sizes are not calculated.
+    """
+    for node_folder, found, sized in stream_node_folders(options):
+        out.write(_record(node_folder, found, sized) + "\n")
+        out.flush()
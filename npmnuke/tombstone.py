@@ -0,0 +1,205 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import typing
+import uuid
+from pathlib import Path
+
+from npmnuke.cache import cache_dir
+from npmnuke.logger import log
+from npmnuke.remove import remove_tree
+
+TOMBSTONE_PREFIX = ".npmnuke-tombstone-"
+
+
+def registry_path() -> Path:
+    """
+    File that lists every tombstone that was created, one path per line.
+    """
+    return cache_dir() / "tombstones"
+
+
+def _read_registry(registry: Path) -> list[Path]:
+    try:
+        with open(registry, "r", encoding="utf-8") as f:
+            return [Path(line) for line in f.read().splitlines() if line]
+    except FileNotFoundError:
+        return []
+
+
+def bury(dir: Path, registry: Path | None = None) -> Path:
+    """
+    Atomically move `dir` out of the way by renaming it to a tombstone next
+    to it, on the same filesystem. Return the path of the tombstone.
+    """
+    registry = registry or registry_path()
+    tombstone = dir.parent / f"{TOMBSTONE_PREFIX}{uuid.uuid4().hex}"
+
+    # registered before the rename, so a crash in between can not lose it
+    registry.parent.mkdir(parents=True, exist_ok=True)
+    with open(registry, "a", encoding="utf-8") as f:
+        f.write(f"{os.path.abspath(tombstone)}\n")
+
+    os.rename(dir, tombstone)
+    log.debug(f"Moved {dir} to {tombstone}")
+
+    return tombstone
+
+
+class Reaper:
+    """
+    Remove tombstones on a background thread.
+
+    Tombstones that are not removed when the program exits are either
+    handed to a detached process with `detach`, or picked up by `resume`
+    on the next start. Used as a context manager it resumes on enter and
+    detaches on exit.
+    """
+
+    def __init__(self, jobs: int = 1, registry: Path | None = None) -> None:
+        self._jobs = jobs
+        self._registry = registry or registry_path()
+        self._queue: queue.Queue[Path] = queue.Queue()
+        self._pending: typing.Set[Path] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "Reaper":
+        # finish removing tombstones left over by earlier runs
+        self.resume()
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # unfinished tombstones are removed after we exit
+        self.detach()
+
+    def bury(self, dir: Path) -> Path:
+        """
+        Move `dir` to a tombstone and queue it for removal.
+        """
+        tombstone = bury(dir, registry=self._registry)
+        self.add(tombstone)
+
+        return tombstone
+
+    def add(self, tombstone: Path) -> None:
+        with self._lock:
+            self._pending.add(tombstone)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name="npmnuke-reaper", daemon=True
+                )
+                self._thread.start()
+
+        self._queue.put(tombstone)
+
+    def resume(self) -> int:
+        """
+        Queue the tombstones left over by earlier runs.
+        Return the number of tombstones found.
+        """
+        # the registry is moved aside before it is read, so a concurrent
+        # `bury` appends to a new registry instead of one being rewritten
+        claimed = self._registry.with_name(
+            f"{self._registry.name}.{os.getpid()}.resume"
+        )
+
+        try:
+            os.replace(self._registry, claimed)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            log.warning(f"Could not claim tombstone registry {self._registry}: {e}")
+            claimed = self._registry
+
+        tombstones = [
+            tombstone
+            for tombstone in dict.fromkeys(_read_registry(claimed))
+            if tombstone.exists()
+        ]
+
+        # the tombstones that are already gone are dropped
+        if claimed != self._registry:
+            try:
+                with open(self._registry, "a", encoding="utf-8") as f:
+                    f.writelines(f"{tombstone}\n" for tombstone in tombstones)
+
+                os.remove(claimed)
+            except OSError as e:
+                log.warning(
+                    f"Could not update tombstone registry {self._registry}: {e}"
+                )
+
+        for tombstone in tombstones:
+            log.debug(f"Resuming removal of {tombstone}")
+            self.add(tombstone)
+
+        return len(tombstones)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self) -> None:
+        """
+        Block until every queued tombstone is removed.
+        """
+        self._queue.join()
+
+    def detach(self) -> None:
+        """
+        Hand the tombstones that are not removed yet to a detached process
+        that keeps running after this one exits.
+        """
+        if not self.pending:
+            return
+
+        log.debug(f"Detaching reaper for {self.pending} tombstones")
+
+        kwargs: typing.Dict[str, typing.Any] = {}
+        if "nt" == os.name:
+            kwargs["creationflags"] = subprocess.DETACHED_PROCESS
+        else:
+            kwargs["start_new_session"] = True
+
+        env = dict(os.environ, NPMNUKE_TOMBSTONES=str(self._registry))
+
+        subprocess.Popen(
+            [sys.executable, "-m", "npmnuke.tombstone"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            **kwargs,
+        )
+
+    def _worker(self) -> None:
+        while True:
+            tombstone = self._queue.get()
+
+            try:
+                remove_tree(str(tombstone), jobs=self._jobs)
+                log.debug(f"Removed {tombstone}")
+            except FileNotFoundError:
+                # already removed by another reaper, unless it is still there
+                if os.path.lexists(tombstone):
+                    log.warning(f"Could not remove {tombstone}, retrying next run")
+            except OSError as e:
+                log.warning(e)
+            finally:
+                with self._lock:
+                    self._pending.discard(tombstone)
+
+                self._queue.task_done()
+
+
+if __name__ == "__main__":
+    registry = os.environ.get("NPMNUKE_TOMBSTONES")
+    reaper = Reaper(registry=Path(registry) if registry else None)
+    reaper.resume()
+    reaper.wait()
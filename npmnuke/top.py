@@ -0,0 +1,46 @@
+import heapq
+import itertools
+
+from npmnuke.models import NodeFolder
+
+
+class TopFolders:
+    """
+    The `n` largest node_modules folders seen so far, kept in a bounded
+    min-heap so memory stays O(n) no matter how many folders are pushed.
+    """
+
+    def __init__(self, n: int) -> None:
+        self.n = n
+        self._heap: list[tuple[float, int, NodeFolder]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, node_folder: NodeFolder) -> tuple[bool, NodeFolder | None]:
+        """
+        Offer a sized folder. Return whether it is kept, and the folder that
+        dropped out of the top to make room for it.
+        """
+        item = (node_folder.size or 0.0, next(self._counter), node_folder)
+
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, item)
+            return True, None
+
+        if item[0] <= self._heap[0][0]:
+            return False, None
+
+        _, _, dropped = heapq.heapreplace(self._heap, item)
+
+        return True, dropped
+
+    def folders(self) -> list[NodeFolder]:
+        """
+        Return the kept folders, largest first.
+        """
+        return [
+            node_folder
+            for _, _, node_folder in sorted(self._heap, key=lambda item: -item[0])
+        ]
@@ -1,4 +1,5 @@
+from .clock import AnimationClock
 from .result_list import NodeResultsList
 from .timer import Timer
 
-__all__ = ["NodeResultsList", "Timer"]
+__all__ = ["AnimationClock", "NodeResultsList", "Timer"]
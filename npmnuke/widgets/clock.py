@@ -0,0 +1,53 @@
+import typing
+
+from textual.app import App
+from textual.timer import Timer
+
+FrameCallback = typing.Callable[[int], None]
+
+
+class AnimationClock:
+    """
+    A single interval that drives every animated widget of the app.
+
+    Widgets subscribe while they are animating and unsubscribe when they
+    are done, the interval is paused while nobody is subscribed.
+    """
+
+    def __init__(self, fps: float = 10) -> None:
+        self.fps = fps
+        self.frame = 0
+        self._subscribers: list[FrameCallback] = []
+        self._timer: Timer | None = None
+
+    def attach(self, app: App) -> None:
+        """
+        Create the interval on the app, has to be called once it is running.
+        """
+        self._timer = app.set_interval(
+            1 / self.fps, self._tick, pause=not self._subscribers
+        )
+
+    def subscribe(self, callback: FrameCallback) -> None:
+        if callback in self._subscribers:
+            return
+
+        self._subscribers.append(callback)
+
+        if self._timer is not None and len(self._subscribers) == 1:
+            self._timer.resume()
+
+    def unsubscribe(self, callback: FrameCallback) -> None:
+        if callback not in self._subscribers:
+            return
+
+        self._subscribers.remove(callback)
+
+        if self._timer is not None and not self._subscribers:
+            self._timer.pause()
+
+    def _tick(self) -> None:
+        self.frame += 1
+
+        for callback in list(self._subscribers):
+            callback(self.frame)
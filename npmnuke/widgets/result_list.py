@@ -1,160 +1,388 @@
 import asyncio
+import bisect
 import typing
 from pathlib import Path
 
-from textual.containers import Horizontal
-from textual.widgets import Label, ListItem, ListView
-
+from rich.cells import set_cell_size
+from rich.segment import Segment
+from textual.binding import Binding
+from textual.events import Click
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from npmnuke.files import format_age
 from npmnuke.logger import log
 from npmnuke.models import NodeFolder
-from npmnuke.widgets.spinner import Spinner
+from npmnuke.widgets.clock import AnimationClock
+
+SIZE_COLUMN_WIDTH = 14
+AGE_COLUMN_WIDTH = 6
+
+# frames of the spinner shown while a size is calculated
+SPINNER_FRAMES = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
 
+T = typing.TypeVar("T")
 
-class NodeResultListItem(ListItem):
-    node_folder: NodeFolder
+
+class NodeResultsList(ScrollView, can_focus=True):
+    """
+    List of the found node_modules folders.
+
+    The rows are kept as plain `NodeFolder` records and only the lines that
+    are visible are rendered, so the cost of the list does not grow with
+    the number of results.
+    """
+
+    BINDINGS = [
+        Binding("down", "cursor_down", "Down", show=False),
+        Binding("up", "cursor_up", "Up", show=False),
+        Binding("pagedown", "page_down", "Page Down", show=False),
+        Binding("pageup", "page_up", "Page Up", show=False),
+        Binding("home", "first", "First", show=False),
+        Binding("end", "last", "Last", show=False),
+    ]
+
+    COMPONENT_CLASSES = {
+        "node-results-list--highlighted",
+        "node-results-list--removed",
+    }
 
     DEFAULT_CSS = """
-    .hide-spinner {
-        display: none;
+    NodeResultsList {
+        height: 1fr;
+        overflow-x: hidden;
     }
-    .result-list-item {
-        content-align: right top;
+    NodeResultsList > .node-results-list--highlighted {
+        background: $accent 50%;
     }
-    .result-list-item-label {
-        width: 92vw;
+    NodeResultsList:focus > .node-results-list--highlighted {
+        background: $accent;
     }
-    .result-list-item-removed {
+    NodeResultsList > .node-results-list--removed {
         color: red;
     }
     """
 
+    index = reactive(0)
+
+    class Highlighted(Message):
+        """
+        Posted when the highlighted row changes.
+        """
+
+        def __init__(
+            self, results_list: "NodeResultsList", node_folder: NodeFolder
+        ) -> None:
+            super().__init__()
+            self.results_list = results_list
+            self.node_folder = node_folder
+
     def __init__(
-        self, node_folder: NodeFolder, skip_calculating_size=False, **kwargs
+        self,
+        *args,
+        clock: AnimationClock,
+        skip_calculating_size=False,
+        top: int | None = None,
+        **kwargs,
     ) -> None:
-        self.node_folder = node_folder
+        super().__init__(*args, **kwargs)
+        self._clock = clock
         self._skip_calculating_size = skip_calculating_size
+        # with `top` only that many sized rows are kept, largest first
+        self._top = top
+        self.node_results: typing.Dict[Path, NodeFolder] = {}
+        self._rows: list[NodeFolder] = []
+        # path of every row to its line, so updates never search the list
+        self._row_index: typing.Dict[Path, int] = {}
+        self._spinner_index = 0
+        # rows that still wait for their size, the spinners run while > 0
+        self._pending_sizes = 0
+        # bytes removed so far of the rows that are being removed
+        self._removed_bytes: typing.Dict[Path, int] = {}
+        self.lock = asyncio.Lock()
+
+    def on_unmount(self) -> None:
+        self._clock.unsubscribe(self._spin)
+
+    @property
+    def highlighted(self) -> NodeFolder | None:
+        if not self._rows:
+            return None
+
+        return self._rows[self.index]
+
+    def rows(self, start: int, end: int) -> list[NodeFolder]:
+        """
+        Return the rows from `start` to `end`.
+        """
+        return self._rows[start:end]
+
+    def validate_index(self, index: int) -> int:
+        return max(0, min(index, len(self._rows) - 1))
+
+    def watch_index(self, old_index: int, index: int) -> None:
+        self.refresh_lines(old_index)
+        self.refresh_lines(index)
 
-        super().__init__(
-            Horizontal(
-                Label(
-                    str(node_folder.path), id="path", classes="result-list-item-label"
-                ),
-                Label("--" if skip_calculating_size else "", id="size"),
-                Spinner(
-                    id="spinner",
-                    classes=f"{'' if not skip_calculating_size else 'hide-spinner'}",
-                ),
-            ),
-            classes="result-list-item",
-            **kwargs,
+        self.scroll_to_region(
+            Region(0, index, self.scrollable_content_region.width, 1),
+            animate=False,
+            force=True,
         )
 
-    def update(
-        self,
-        *,
-        path: Path,
-        size: float | None = None,
-        removed: bool = False,
-    ) -> None:
-        self.children[0].text = str(path)
-        if size is not None and not self._skip_calculating_size:
-            self.query_one("#size").update(f"{size:.2f} MB")
-            self.query_one("#spinner").stop()
+        if self._rows:
+            self.post_message(self.Highlighted(self, self._rows[index]))
 
-        if removed:
-            self.add_class("result-list-item-removed")
-        else:
-            self.remove_class("result-list-item-removed")
+    def action_cursor_down(self) -> None:
+        self.index += 1
 
+    def action_cursor_up(self) -> None:
+        self.index -= 1
 
-class NodeResultsList(ListView):
-    class Selected(ListView.Selected):
-        def __init__(self, list_view: typing.Self, item: NodeResultListItem) -> None:
-            super().__init__(list_view, item)
-            self.item: NodeResultListItem
+    def action_page_down(self) -> None:
+        self.index += self.scrollable_content_region.height
 
-    def __init__(self, *args, skip_calculating_size=False, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._skip_calculating_size = skip_calculating_size
-        self.node_results: typing.Dict[Path, NodeFolder] = {}
-        self.lock = asyncio.Lock()
+    def action_page_up(self) -> None:
+        self.index -= self.scrollable_content_region.height
 
-    async def start_consumer(self, queue: asyncio.Queue[Path]) -> None:
-        while True:
-            node_result = await queue.get()
+    def action_first(self) -> None:
+        self.index = 0
+
+    def action_last(self) -> None:
+        self.index = len(self._rows) - 1
+
+    def on_click(self, event: Click) -> None:
+        row = self.scroll_offset.y + event.y
+
+        if row < len(self._rows):
+            self.index = row
+
+    def render_line(self, y: int) -> Strip:
+        width = self.scrollable_content_region.width
+        row = self.scroll_offset.y + y
+        style = self.rich_style
+
+        if row >= len(self._rows):
+            return Strip.blank(width, style)
+
+        node_folder = self._rows[row]
+
+        if node_folder.removed:
+            style += self.get_component_rich_style("node-results-list--removed")
+
+        if row == self.index:
+            style += self.get_component_rich_style("node-results-list--highlighted")
+
+        path_width = max(width - SIZE_COLUMN_WIDTH - AGE_COLUMN_WIDTH, 0)
+        path = str(node_folder.path)
+
+        if node_folder.members:
+            path = f"{path} (+{len(node_folder.members)} workspace packages)"
+
+        path = set_cell_size(path, path_width)
+        size = self._size_text(node_folder).rjust(SIZE_COLUMN_WIDTH)
+        age = format_age(node_folder.last_activity).rjust(AGE_COLUMN_WIDTH)
+
+        return Strip([Segment(path + size + age, style)], width)
+
+    def _size_text(self, node_folder: NodeFolder) -> str:
+        if node_folder.path in self._removed_bytes:
+            removed_mb = self._removed_bytes[node_folder.path] / 1024 / 1024
+            return f"-{removed_mb:.2f} MB"
+
+        if self._skip_calculating_size:
+            return "--"
+
+        if node_folder.size is None:
+            return SPINNER_FRAMES[self._spinner_index]
 
-            if node_result is None:
-                asyncio.sleep(0.1)
+        if node_folder.approximate:
+            return f"~{node_folder.size:.2f} MB"
 
-            await self._append(node_result)
+        return f"{node_folder.size:.2f} MB"
+
+    def _spin(self, frame: int) -> None:
+        self._spinner_index = frame % len(SPINNER_FRAMES)
+
+        # only redraw when a visible row is still waiting for its size
+        top = self.scroll_offset.y
+        visible = self._rows[top : top + self.scrollable_content_region.height]
+
+        if any(node_folder.size is None for node_folder in visible):
+            self.refresh()
+
+    async def start_consumer(self, queue: asyncio.Queue[NodeFolder]) -> None:
+        while True:
+            node_folders = await self._next_batch(queue)
+
+            await self._append(node_folders)
 
     async def start_size_consumer(
-        self, queue: asyncio.Queue[tuple[Path, float]]
+        self, queue: asyncio.Queue[tuple[Path, float, bool]]
     ) -> None:
         while True:
-            node_result, size = await queue.get()
+            sizes = await self._next_batch(queue)
 
-            if node_result is None:
-                asyncio.sleep(0.1)
+            log.debug(f"SizeUpdate: {len(sizes)} sizes")
 
-            log.debug(f"SizeUpdate: {node_result} {size}")
-
-            await self._update_size(node_result, size)
+            await self._update_sizes(sizes)
 
     async def start_removed_consumer(self, queue: asyncio.Queue[NodeFolder]) -> None:
         while True:
-            node_folder = await queue.get()
+            node_folders = await self._next_batch(queue)
+
+            await self._mark_removed(node_folders)
+
+    async def start_removing_consumer(
+        self, queue: asyncio.Queue[tuple[Path, int]]
+    ) -> None:
+        while True:
+            progress = await self._next_batch(queue)
 
-            if node_folder is None:
-                asyncio.sleep(0.1)
+            await self._update_removing(progress)
 
-            await self._mark_removed(node_folder)
+    async def _next_batch(self, queue: asyncio.Queue[T]) -> list[T]:
+        """
+        Wait for the next item of `queue` and return it together with
+        everything else that arrives until the next frame.
+        """
+        batch = [await queue.get()]
 
-    async def _mark_removed(self, node_folder: NodeFolder) -> None:
+        # let the producers fill the queue for the rest of the frame
+        await asyncio.sleep(1 / self._clock.fps)
+
+        while True:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        return [item for item in batch if item is not None]
+
+    async def _mark_removed(self, node_folders: list[NodeFolder]) -> None:
         async with self.lock:
-            if node_folder.path not in self.node_results:
-                log.error(f"Remove: Node result {node_folder.path} not found")
-                return
+            rows: list[int] = []
 
-            self.node_results[node_folder.path].removed = True
+            for node_folder in node_folders:
+                if node_folder.path not in self._row_index:
+                    log.error(f"Remove: Node result {node_folder.path} not found")
+                    continue
 
-            await self._update_list_item(node_folder.path)
+                self.node_results[node_folder.path].removed = True
+                self._removed_bytes.pop(node_folder.path, None)
+                rows.append(self._row_index[node_folder.path])
 
-    async def _append(self, node_result: Path) -> None:
-        node_folder = NodeFolder(path=node_result)
-        id = NodeResultsList.path_to_id(node_result)
-        list_item = NodeResultListItem(
-            node_folder,
-            id=id,
-            skip_calculating_size=self._skip_calculating_size,
-        )
+            self._update_list_items(rows)
+
+    async def _append(self, node_folders: list[NodeFolder]) -> None:
+        if not node_folders:
+            return
+
+        if self._top is not None:
+            await self._insert_top(node_folders)
+            return
 
         async with self.lock:
-            self.node_results[node_result] = node_folder
-            self.append(list_item)
+            first_row = len(self._rows)
+
+            for node_folder in node_folders:
+                self.node_results[node_folder.path] = node_folder
+                self._row_index[node_folder.path] = len(self._rows)
+                self._rows.append(node_folder)
+
+                if node_folder.size is None and not self._skip_calculating_size:
+                    self._pending_sizes += 1
+
+            if self._pending_sizes:
+                self._clock.subscribe(self._spin)
+
+            self.virtual_size = Size(0, len(self._rows))
 
-    async def _update_size(self, node_result: Path, size: float) -> None:
+            if first_row == 0:
+                # the first row is highlighted right away
+                self.post_message(self.Highlighted(self, self._rows[0]))
+
+            self.refresh_lines(first_row, len(node_folders))
+
+    async def _insert_top(self, node_folders: list[NodeFolder]) -> None:
         async with self.lock:
-            if node_result not in self.node_results:
-                log.error(f"SizeUpdate: Node result {node_result} not found")
-                return
+            was_empty = not self._rows
 
-            self.node_results[node_result].size = size
+            for node_folder in node_folders:
+                bisect.insort(
+                    self._rows, node_folder, key=lambda row: -(row.size or 0.0)
+                )
+                self.node_results[node_folder.path] = node_folder
 
-            await self._update_list_item(node_result)
+            for dropped in self._rows[self._top :]:
+                del self.node_results[dropped.path]
+                self._row_index.pop(dropped.path, None)
 
-    async def _update_list_item(self, node_result: Path) -> None:
-        id = NodeResultsList.path_to_id(node_result)
-        list_item = typing.cast(NodeResultListItem, self.query_one(f"#{id}"))
+            del self._rows[self._top :]
 
-        node_folder = self.node_results[node_result]
+            for row, node_folder in enumerate(self._rows):
+                self._row_index[node_folder.path] = row
 
-        list_item.update(
-            path=node_folder.path,
-            size=node_folder.size,
-            removed=node_folder.removed,
-        )
+            self.virtual_size = Size(0, len(self._rows))
+
+            if was_empty and self._rows:
+                self.post_message(self.Highlighted(self, self._rows[0]))
+
+            # rows move around, so the whole view is drawn again
+            self.refresh()
+
+    async def _update_sizes(self, sizes: list[tuple[Path, float, bool]]) -> None:
+        async with self.lock:
+            rows: list[int] = []
+
+            for node_result, size, approximate in sizes:
+                if node_result not in self._row_index:
+                    log.error(f"SizeUpdate: Node result {node_result} not found")
+                    continue
+
+                node_folder = self.node_results[node_result]
+
+                if approximate and node_folder.size_calculated:
+                    # the exact size came first
+                    continue
+
+                if node_folder.size is None:
+                    self._pending_sizes -= 1
+
+                node_folder.size = size
+                node_folder.size_calculated = not approximate
+                node_folder.approximate = approximate
+                rows.append(self._row_index[node_result])
+
+            if not self._pending_sizes:
+                self._clock.unsubscribe(self._spin)
+
+            self._update_list_items(rows)
+
+    async def _update_removing(self, progress: list[tuple[Path, int]]) -> None:
+        async with self.lock:
+            rows: list[int] = []
+
+            for path, removed_bytes in progress:
+                row = self._row_index.get(path)
+
+                # a late report of a folder that is already removed
+                if row is None or self._rows[row].removed:
+                    continue
+
+                self._removed_bytes[path] = removed_bytes
+                rows.append(row)
+
+            self._update_list_items(rows)
+
+    def _update_list_items(self, rows: list[int]) -> None:
+        top = self.scroll_offset.y
+        bottom = top + self.scrollable_content_region.height
 
-    @staticmethod
-    def path_to_id(path: Path) -> str:
-        return str(path).replace("/", "-").replace("\\", "-").replace(".", "-")
+        # rows outside of the view are drawn fresh when scrolled to
+        for row in rows:
+            if top <= row < bottom:
+                self.refresh_lines(row)
@@ -3,6 +3,8 @@ from time import monotonic
 from textual.reactive import reactive
 from textual.widgets import Static
 
+from npmnuke.widgets.clock import AnimationClock
+
 
 class Timer(Static):
     """A widget to display elapsed time."""
@@ -11,11 +13,14 @@ class Timer(Static):
     time = reactive(0.0)
     total = reactive(0.0)
 
-    def on_mount(self) -> None:
-        """Event handler called when widget is added to the app."""
-        self.update_timer = self.set_interval(1 / 60, self.update_time, pause=True)
+    def __init__(self, clock: AnimationClock, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._clock = clock
+
+    def on_unmount(self) -> None:
+        self._clock.unsubscribe(self.update_time)
 
-    def update_time(self) -> None:
+    def update_time(self, frame: int = 0) -> None:
         """Method to update time to current."""
         self.time = self.total + (monotonic() - self.start_time)
 
@@ -28,11 +33,11 @@ class Timer(Static):
     def start(self) -> None:
         """Method to start (or resume) time updating."""
         self.start_time = monotonic()
-        self.update_timer.resume()
+        self._clock.subscribe(self.update_time)
 
     def stop(self) -> None:
         """Method to stop the time display updating."""
-        self.update_timer.pause()
+        self._clock.unsubscribe(self.update_time)
         self.total += monotonic() - self.start_time
         self.time = self.total
 
@@ -0,0 +1,207 @@
+import functools
+import json
+import os
+import re
+import typing
+
+from npmnuke.ignore import translate_glob
+from npmnuke.logger import log
+
+PACKAGE_JSON = "package.json"
+PNPM_WORKSPACE = "pnpm-workspace.yaml"
+
+
+def _mtime_ns(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _package_json_patterns(path: str) -> list[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            package = json.load(f)
+    except (OSError, ValueError) as e:
+        log.debug(f"Could not read {path}: {e}")
+        return []
+
+    workspaces = package.get("workspaces") if isinstance(package, dict) else None
+
+    # yarn also allows {"packages": [...], "nohoist": [...]}
+    if isinstance(workspaces, dict):
+        workspaces = workspaces.get("packages")
+
+    if not isinstance(workspaces, list):
+        return []
+
+    return [pattern for pattern in workspaces if isinstance(pattern, str)]
+
+
+def _pnpm_workspace_patterns(path: str) -> list[str]:
+    """
+    Read the `packages` list of a pnpm-workspace.yaml. Only the plain block
+    and flow lists pnpm documents are understood, not YAML in general.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (OSError, ValueError) as e:
+        log.debug(f"Could not read {path}: {e}")
+        return []
+
+    patterns: list[str] = []
+    in_packages = False
+
+    for line in lines:
+        content = line.split(" #", 1)[0].rstrip()
+
+        if not content.strip() or content.lstrip().startswith("#"):
+            continue
+
+        if not line[0].isspace():
+            key, _, value = content.partition(":")
+            in_packages = key.strip() == "packages"
+
+            if in_packages and value.strip().startswith("["):
+                patterns += value.strip().strip("[]").split(",")
+                in_packages = False
+
+            continue
+
+        if in_packages and content.lstrip().startswith("-"):
+            patterns.append(content.lstrip()[1:])
+
+    patterns = [pattern.strip().strip("'\"") for pattern in patterns]
+
+    return [pattern for pattern in patterns if pattern]
+
+
+@functools.lru_cache(maxsize=1024)
+def _workspace_patterns(
+    dir: str, package_json_mtime: int | None, pnpm_workspace_mtime: int | None
+) -> tuple[str, ...]:
+    # the modification times are part of the key, so edited files are read again
+    patterns: list[str] = []
+
+    if package_json_mtime is not None:
+        patterns += _package_json_patterns(os.path.join(dir, PACKAGE_JSON))
+
+    if pnpm_workspace_mtime is not None:
+        patterns += _pnpm_workspace_patterns(os.path.join(dir, PNPM_WORKSPACE))
+
+    return tuple(patterns)
+
+
+def workspace_patterns(dir: str) -> tuple[str, ...]:
+    """
+    Return the workspace patterns of the project in `dir`, from the
+    `workspaces` field of its package.json and from its pnpm-workspace.yaml.
+    Each file is parsed once as long as it does not change.
+    """
+    return _workspace_patterns(
+        dir,
+        _mtime_ns(os.path.join(dir, PACKAGE_JSON)),
+        _mtime_ns(os.path.join(dir, PNPM_WORKSPACE)),
+    )
+
+
+def _subdirs(dir: str, relative: str, depth: int | None) -> typing.Iterator[str]:
+    """
+    Yield the paths, relative to `dir` with "/" separators, of the folders
+    below `relative`, at most `depth` levels deep. node_modules, dot folders
+    and links are not entered.
+    """
+    stack = [(relative, 0)]
+
+    while stack:
+        current, level = stack.pop()
+
+        if depth is not None and level >= depth:
+            continue
+
+        try:
+            with os.scandir(os.path.join(dir, current)) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        for entry in entries:
+            if entry.name == "node_modules" or entry.name.startswith("."):
+                continue
+
+            try:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+
+            subdir = f"{current}/{entry.name}" if current else entry.name
+            yield subdir
+            stack.append((subdir, level + 1))
+
+
+def _expand(dir: str, pattern: str) -> typing.Set[str]:
+    """
+    Return the package folders (with a package.json) matching `pattern`,
+    relative to `dir` with "/" separators. Only the folders below the
+    literal start of the pattern are read, as deep as the pattern goes.
+    """
+    segments = [segment for segment in pattern.split("/") if segment not in ("", ".")]
+
+    literal: list[str] = []
+    for segment in segments:
+        if re.search(r"[*?\[\\]", segment):
+            break
+        literal.append(segment)
+
+    start = "/".join(literal)
+    rest = segments[len(literal) :]
+
+    if rest:
+        depth = None if "**" in rest else len(rest)
+        candidates: typing.Iterable[str] = _subdirs(dir, start, depth)
+    else:
+        candidates = [start] if start else []
+
+    regex = re.compile(translate_glob("/" + "/".join(segments)))
+
+    return {
+        candidate
+        for candidate in candidates
+        if regex.fullmatch(candidate)
+        and os.path.isfile(os.path.join(dir, candidate, PACKAGE_JSON))
+    }
+
+
+def workspace_members(dir: str) -> list[str]:
+    """
+    Return the member package folders of the workspace in `dir`, an empty
+    list when it is not a workspace root. Patterns starting with `!`
+    exclude folders, only folders with a package.json are members and
+    nothing inside a node_modules folder is one.
+
+    Members are joined to `dir` as given, so they are spelled the way a
+    scan that reached `dir` spells its subdirectories.
+    """
+    patterns = workspace_patterns(dir)
+
+    if not patterns:
+        return []
+
+    members: typing.Set[str] = set()
+    excluded = [
+        re.compile(translate_glob("/" + pattern[1:].strip("/")))
+        for pattern in patterns
+        if pattern.startswith("!")
+    ]
+
+    for pattern in patterns:
+        if not pattern.startswith("!"):
+            members |= _expand(dir, pattern)
+
+    return sorted(
+        os.path.join(dir, *member.split("/"))
+        for member in members
+        if not any(regex.fullmatch(member) for regex in excluded)
+    )
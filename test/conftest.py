@@ -0,0 +1,37 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from npmnuke.policy import SECONDS_PER_DAY
+
+
+@pytest.fixture(autouse=True)
+def tmpdir() -> None:
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        tmpdir = Path(tmpdirname)
+        yield tmpdir
+
+
+def make_project(
+    tmpdir: Path, name: str = "project", size_kb: int = 1, age_days: float | None = None
+) -> Path:
+    """
+    Create a project with a node_modules folder of `size_kb` KB. With
+    `age_days` it gets a package.json last changed that many days ago.
+    """
+    node_modules_dir = tmpdir / name / "node_modules"
+    node_modules_dir.mkdir(parents=True, exist_ok=True)
+
+    file = node_modules_dir / "file.txt"
+    file.write_text("a" * 1024 * size_kb, encoding="ASCII")
+
+    if age_days is not None:
+        package_json = tmpdir / name / "package.json"
+        package_json.write_text("{}", encoding="utf-8")
+        mtime = time.time() - age_days * SECONDS_PER_DAY
+        os.utime(package_json, (mtime, mtime))
+
+    return tmpdir / name
@@ -0,0 +1,211 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from npmnuke import files
+from npmnuke import pool as pool_module
+from npmnuke.cache import ScanFrontier, ScanIndex, SizeCache, size_fingerprint
+from npmnuke.files import find_node_modules_dirs, scan_node_modules_dirs
+from npmnuke.pool import SizePool
+from test.conftest import make_project
+
+
+def make_old(tmpdir: Path) -> None:
+    """
+    Move the mtime of all directories out of the racy window.
+    """
+    old = time.time() - 3600
+
+    for root, dirs, _ in os.walk(tmpdir):
+        for dir in dirs:
+            os.utime(os.path.join(root, dir), (old, old))
+
+    os.utime(tmpdir, (old, old))
+
+
+def count_scandir(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    calls: list[str] = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        calls.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(files.os, "scandir", counting_scandir)
+
+    return calls
+
+
+def test_scan_index_skips_unchanged_directories(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    workspace = tmpdir / "workspace"
+    for i in range(3):
+        (workspace / str(i) / "src" / "node_modules").mkdir(parents=True)
+    make_old(workspace)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    first = sorted(find_node_modules_dirs(workspace, index=index))
+    index.save()
+
+    calls = count_scandir(monkeypatch)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    second = sorted(find_node_modules_dirs(workspace, index=index))
+
+    assert first == second == [workspace / str(i) / "src" for i in range(3)]
+    assert calls == []
+
+
+def test_scan_index_reads_changed_directories(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    workspace = tmpdir / "workspace"
+    (workspace / "0" / "node_modules").mkdir(parents=True)
+    (workspace / "1").mkdir(parents=True)
+    make_old(workspace)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    assert list(find_node_modules_dirs(workspace, index=index)) == [workspace / "0"]
+    index.save()
+
+    (workspace / "1" / "node_modules").mkdir()
+
+    calls = count_scandir(monkeypatch)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    node_modules_dirs = sorted(find_node_modules_dirs(workspace, index=index))
+
+    assert node_modules_dirs == [workspace / "0", workspace / "1"]
+    assert calls == [str(workspace / "1")]
+
+
+def test_scan_index_does_not_trust_recently_modified_directories(
+    tmpdir: Path,
+) -> None:
+    workspace = tmpdir / "workspace"
+    (workspace / "node_modules").mkdir(parents=True)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    list(find_node_modules_dirs(workspace, index=index))
+
+    assert index.get(str(workspace), os.stat(workspace)) is None
+
+
+def test_scan_index_ignores_corrupt_file(tmpdir: Path) -> None:
+    workspace = tmpdir / "workspace"
+    (workspace / "node_modules").mkdir(parents=True)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    index.path.parent.mkdir(parents=True)
+    index.path.write_text("{", encoding="utf-8")
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+
+    assert list(find_node_modules_dirs(workspace, index=index)) == [workspace]
+
+
+def test_size_cache_reuses_size_of_unchanged_folder(tmpdir: Path) -> None:
+    project = make_project(tmpdir)
+
+    cache = SizeCache.load(directory=tmpdir / "cache")
+    cache.set(project, size_fingerprint(project), 42.0)
+    cache.save()
+
+    cache = SizeCache.load(directory=tmpdir / "cache")
+
+    assert cache.get(project, size_fingerprint(project)) == 42.0
+
+
+def test_size_cache_is_invalidated_by_lockfile_change(tmpdir: Path) -> None:
+    project = make_project(tmpdir)
+
+    cache = SizeCache(tmpdir / "cache" / "sizes.json")
+    cache.set(project, size_fingerprint(project), 42.0)
+
+    (project / "package-lock.json").write_text("{}", encoding="utf-8")
+
+    assert cache.get(project, size_fingerprint(project)) is None
+
+
+def test_size_cache_evicts_least_recently_used_entries(tmpdir: Path) -> None:
+    cache = SizeCache(tmpdir / "cache" / "sizes.json", max_entries=2)
+
+    for i in range(3):
+        cache.set(tmpdir / str(i), [i], float(i))
+        # last used i seconds after the first entry
+        cache._entries[os.path.abspath(tmpdir / str(i))][2] = time.time() - 10 + i
+
+    cache.save()
+    cache = SizeCache.load(directory=tmpdir / "cache")
+
+    assert cache.get(tmpdir / "0", [0]) is None
+    assert cache.get(tmpdir / "1", [1]) == 1.0
+    assert cache.get(tmpdir / "2", [2]) == 2.0
+
+
+def test_size_pool_uses_size_cache(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    project = make_project(tmpdir)
+
+    cache = SizeCache(tmpdir / "cache" / "sizes.json")
+    cache.set(project, size_fingerprint(project), 42.0)
+
+    def calculate_size(dir: Path, **kwargs) -> float:
+        raise AssertionError("size should come from the cache")
+
+    monkeypatch.setattr(pool_module, "calculate_size", calculate_size)
+
+    with SizePool(jobs=1, cache=cache) as pool:
+        assert pool.submit(project).result() == 42.0
+
+
+def test_scan_node_modules_dirs_fills_size_cache(tmpdir: Path) -> None:
+    project = make_project(tmpdir)
+
+    cache = SizeCache(tmpdir / "cache" / "sizes.json")
+    node_folders = list(
+        scan_node_modules_dirs(tmpdir, calculate_sizes=True, size_cache=cache)
+    )
+
+    assert node_folders[0].size == pytest.approx(1 / 1024, 0.0001)
+    assert cache.get(project, size_fingerprint(project)) == node_folders[0].size
+
+
+def test_scan_index_remembers_ignore_marker(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    workspace = tmpdir / "workspace"
+    (workspace / "archive" / "old" / "node_modules").mkdir(parents=True)
+    (workspace / "archive" / ".npmnukeignore").touch()
+    make_old(workspace)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    assert list(find_node_modules_dirs(workspace, index=index)) == []
+    index.save()
+
+    calls = count_scandir(monkeypatch)
+
+    index = ScanIndex.load(workspace, directory=tmpdir / "cache")
+    assert list(find_node_modules_dirs(workspace, index=index)) == []
+    assert calls == []
+
+
+def test_scan_frontier_is_removed_once_the_scan_is_complete(tmpdir: Path) -> None:
+    frontier = ScanFrontier.load(tmpdir, directory=tmpdir / "cache")
+    frontier.dirs = [str(tmpdir / "a")]
+    frontier.save()
+
+    assert ScanFrontier.load(tmpdir, directory=tmpdir / "cache").dirs == [
+        str(tmpdir / "a")
+    ]
+    fresh = ScanFrontier.load(tmpdir, resume=False, directory=tmpdir / "cache")
+    assert fresh.dirs == []
+
+    frontier.dirs = []
+    frontier.save()
+
+    assert not frontier.path.exists()
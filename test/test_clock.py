@@ -0,0 +1,57 @@
+from npmnuke.widgets.clock import AnimationClock
+
+
+class FakeTimer:
+    def __init__(self) -> None:
+        self.paused = True
+
+    def pause(self) -> None:
+        self.paused = True
+
+    def resume(self) -> None:
+        self.paused = False
+
+
+def make_clock() -> tuple[AnimationClock, FakeTimer]:
+    clock = AnimationClock()
+    timer = FakeTimer()
+    clock._timer = timer
+    return clock, timer
+
+
+def test_clock_runs_only_while_subscribed() -> None:
+    clock, timer = make_clock()
+    frames: list[int] = []
+
+    clock.subscribe(frames.append)
+    clock.subscribe(frames.append)
+    assert not timer.paused
+
+    clock._tick()
+    clock._tick()
+    assert frames == [1, 2]
+
+    clock.unsubscribe(frames.append)
+    assert timer.paused
+
+    clock._tick()
+    assert frames == [1, 2]
+
+
+def test_clock_shares_frames_between_subscribers() -> None:
+    clock, timer = make_clock()
+    first: list[int] = []
+    second: list[int] = []
+
+    clock.subscribe(first.append)
+    clock._tick()
+    clock.subscribe(second.append)
+    clock._tick()
+
+    clock.unsubscribe(first.append)
+    assert not timer.paused
+
+    clock._tick()
+
+    assert first == [1, 2]
+    assert second == [2, 3]
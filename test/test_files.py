@@ -1,23 +1,35 @@
+import asyncio
+import inspect
+import itertools
 import os
-import tempfile
+import time
 from collections.abc import Iterator
 from pathlib import Path
 
 import pytest
 
-from npmnuke.files import calculate_size, find_node_modules_dirs, remove_node_modules
+from npmnuke import files
+from npmnuke import mounts as mounts_module
+from npmnuke.cache import ScanFrontier
+from npmnuke.files import (
+    InodeSet,
+    ESTIMATE_SAMPLES,
+    afind_node_modules_dirs,
+    ascan_node_modules_dirs,
+    calculate_size,
+    estimate_size,
+    find_node_modules_dirs,
+    format_age,
+    remove_node_modules,
+    scan_kwargs,
+    scan_node_modules_dirs,
+)
+from npmnuke.models import DialogSettings
 
 if os.name == "nt":
     import _winapi
 
 
-@pytest.fixture(autouse=True)
-def tmpdir() -> None:
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        tmpdir = Path(tmpdirname)
-        yield tmpdir
-
-
 def test_find_node_modules_dirs(tmpdir: Path) -> None:
     node_modules_dir = tmpdir / f"node_modules"
     node_modules_dir.mkdir(parents=True, exist_ok=True)
@@ -108,6 +120,141 @@ def test_find_node_modules_dirs_ignores_folders_in_ignore_set(
     assert len(node_modules_dirs) == 0
 
 
+def test_find_node_modules_dirs_ignores_anchored_path(tmpdir: Path) -> None:
+    (tmpdir / "work" / "archive" / "node_modules").mkdir(parents=True)
+    (tmpdir / "other" / "archive" / "node_modules").mkdir(parents=True)
+
+    node_modules_dirs = list(
+        find_node_modules_dirs(tmpdir, ignore_set={"work/archive"})
+    )
+
+    assert node_modules_dirs == [Path(tmpdir / "other" / "archive")]
+
+
+def test_find_node_modules_dirs_skips_folders_with_ignore_marker(
+    tmpdir: Path,
+) -> None:
+    (tmpdir / "archive" / "old" / "node_modules").mkdir(parents=True)
+    (tmpdir / "archive" / "node_modules").mkdir()
+    (tmpdir / "archive" / ".npmnukeignore").touch()
+    (tmpdir / "project" / "node_modules").mkdir(parents=True)
+    # the marker in the scanned folder is the default ignore file
+    (tmpdir / ".npmnukeignore").touch()
+
+    node_modules_dirs = list(find_node_modules_dirs(tmpdir, ignore_dot=False))
+
+    assert node_modules_dirs == [Path(tmpdir / "project")]
+
+
+def test_find_node_modules_dirs_one_file_system(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (tmpdir / "local" / "node_modules").mkdir(parents=True)
+    (tmpdir / "mnt" / "project" / "node_modules").mkdir(parents=True)
+
+    stat = os.stat
+
+    def other_device_stat(path, *args, **kwargs):
+        result = stat(path, *args, **kwargs)
+
+        if str(path) == str(tmpdir / "mnt"):
+            fields = list(result[:10])
+            fields[2] = result.st_dev + 1
+            return os.stat_result(fields)
+
+        return result
+
+    monkeypatch.setattr(os, "stat", other_device_stat)
+
+    assert sorted(find_node_modules_dirs(tmpdir)) == [
+        Path(tmpdir / "local"),
+        Path(tmpdir / "mnt" / "project"),
+    ]
+    assert list(find_node_modules_dirs(tmpdir, one_file_system=True)) == [
+        Path(tmpdir / "local")
+    ]
+
+
+def test_find_node_modules_dirs_skips_mounts_of_skipped_types(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (tmpdir / "share" / "node_modules").mkdir(parents=True)
+    (tmpdir / "local" / "node_modules").mkdir(parents=True)
+
+    mounts = (("/", "ext4"), (str(Path(tmpdir / "share").resolve()), "nfs4"))
+    monkeypatch.setattr(mounts_module, "read_mounts", lambda: mounts)
+
+    node_modules_dirs = list(
+        find_node_modules_dirs(Path(tmpdir).resolve(), skip_fs_types={"nfs4"})
+    )
+
+    assert node_modules_dirs == [Path(tmpdir / "local").resolve()]
+
+
+@pytest.mark.skipif("nt" == os.name, reason="Windows does not support symlinks")
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_find_node_modules_dirs_follows_links_once(tmpdir: Path, jobs: int) -> None:
+    (tmpdir / "projects" / "a" / "node_modules").mkdir(parents=True)
+    (tmpdir / "other" / "b" / "node_modules").mkdir(parents=True)
+    # a link back to a parent and two links to the same folder
+    (tmpdir / "projects" / "a" / "loop").symlink_to(tmpdir)
+    (tmpdir / "projects" / "b").symlink_to(tmpdir / "other" / "b")
+    (tmpdir / "projects" / "c").symlink_to(tmpdir / "other" / "b")
+
+    assert sorted(find_node_modules_dirs(tmpdir / "projects", jobs=jobs)) == [
+        Path(tmpdir / "projects" / "a")
+    ]
+
+    node_modules_dirs = list(
+        find_node_modules_dirs(tmpdir / "projects", jobs=jobs, follow_links=True)
+    )
+
+    assert len(node_modules_dirs) == 2
+    assert {path.resolve() for path in node_modules_dirs} == {
+        Path(tmpdir / "projects" / "a").resolve(),
+        Path(tmpdir / "other" / "b").resolve(),
+    }
+
+
+def test_find_node_modules_dirs_max_depth(tmpdir: Path) -> None:
+    (tmpdir / "node_modules").mkdir()
+    (tmpdir / "a" / "node_modules").mkdir(parents=True)
+    (tmpdir / "a" / "b" / "node_modules").mkdir(parents=True)
+    (tmpdir / "c" / "d" / "e" / "node_modules").mkdir(parents=True)
+
+    assert list(find_node_modules_dirs(tmpdir, max_depth=0)) == [Path(tmpdir)]
+    assert sorted(find_node_modules_dirs(tmpdir / "c", max_depth=2)) == [
+        Path(tmpdir / "c" / "d" / "e")
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_find_node_modules_dirs_continues_after_time_budget(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch, jobs: int
+) -> None:
+    for name in "abcd":
+        (tmpdir / name / "node_modules").mkdir(parents=True)
+
+    # every call is a second later, the budget lasts for the first directories
+    clock = itertools.count()
+    monkeypatch.setattr(files.time, "monotonic", lambda: next(clock))
+
+    frontier = ScanFrontier.load(tmpdir, directory=tmpdir / "cache")
+    first = list(
+        find_node_modules_dirs(tmpdir, jobs=jobs, time_budget=2.5, frontier=frontier)
+    )
+
+    assert first
+    assert len(frontier.dirs) == 4 - len(first)
+
+    frontier.save()
+    frontier = ScanFrontier.load(tmpdir, directory=tmpdir / "cache")
+    second = list(find_node_modules_dirs(tmpdir, jobs=jobs, frontier=frontier))
+
+    assert sorted(first + second) == [Path(tmpdir / name) for name in "abcd"]
+    assert frontier.dirs == []
+
+
 def test_find_node_modules_itertor(tmpdir: Path) -> None:
     node_modules_dir = tmpdir / f"node_modules"
     node_modules_dir.mkdir(parents=True, exist_ok=True)
@@ -117,6 +264,203 @@ def test_find_node_modules_itertor(tmpdir: Path) -> None:
     assert isinstance(node_modules_dirs_iter, Iterator)
 
 
+def test_afind_node_modules_dirs(tmpdir: Path) -> None:
+    for i in range(10):
+        (tmpdir / str(i) / "node_modules").mkdir(parents=True)
+
+    async def find() -> list[Path]:
+        return [path async for path in afind_node_modules_dirs(tmpdir, jobs=2)]
+
+    assert sorted(asyncio.run(find())) == sorted(
+        Path(tmpdir / str(i)) for i in range(10)
+    )
+
+
+def test_ascan_node_modules_dirs_pauses_for_slow_consumer(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    for i in range(20):
+        (tmpdir / str(i) / "node_modules").mkdir(parents=True)
+
+    found = 0
+    scan = files.scan_node_modules_dirs
+
+    def counting_scan(*args, **kwargs):
+        nonlocal found
+        for node_folder in scan(*args, **kwargs):
+            found += 1
+            yield node_folder
+
+    monkeypatch.setattr(files, "scan_node_modules_dirs", counting_scan)
+
+    async def consume_one() -> int:
+        node_folders = ascan_node_modules_dirs(tmpdir, max_pending=2)
+        await anext(node_folders)
+        await asyncio.sleep(0.2)
+        await node_folders.aclose()
+
+        return found
+
+    # one consumed, two waiting and one found while waiting for a slot
+    assert asyncio.run(consume_one()) <= 4
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_ascan_node_modules_dirs_stops_scanning_when_closed(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch, jobs: int
+) -> None:
+    (tmpdir / "node_modules").mkdir()
+    for i in range(40):
+        (tmpdir / str(i)).mkdir()
+
+    scanned = 0
+    scan_dir = files._scan_dir
+
+    def slow_scan_dir(dir: str, options) -> tuple[bool, list[str]]:
+        nonlocal scanned
+        scanned += 1
+        time.sleep(0.05)
+        return scan_dir(dir, options)
+
+    monkeypatch.setattr(files, "_scan_dir", slow_scan_dir)
+
+    async def consume_one() -> None:
+        node_folders = ascan_node_modules_dirs(tmpdir, jobs=jobs)
+        await anext(node_folders)
+        await node_folders.aclose()
+
+    start = time.monotonic()
+    asyncio.run(consume_one())
+    time.sleep(0.2)
+
+    # the whole tree takes 2s to scan
+    assert time.monotonic() - start < 1
+    assert scanned < 20
+
+
+def test_afind_node_modules_dirs_raises_for_missing_folder(tmpdir: Path) -> None:
+    async def find() -> list[Path]:
+        return [path async for path in afind_node_modules_dirs(tmpdir / "missing")]
+
+    with pytest.raises(ValueError):
+        asyncio.run(find())
+
+
+@pytest.mark.skipif(
+    "nt" == os.name or os.geteuid() == 0, reason="Permissions are not enforced"
+)
+def test_find_node_modules_skips_unreadable_folders(tmpdir: Path) -> None:
+    unreadable_dir = tmpdir / "0"
+    unreadable_dir.mkdir(parents=True, exist_ok=True)
+    (tmpdir / "1" / "node_modules").mkdir(parents=True, exist_ok=True)
+
+    unreadable_dir.chmod(0)
+
+    try:
+        node_modules_dirs = list(find_node_modules_dirs(tmpdir))
+    finally:
+        unreadable_dir.chmod(0o755)
+
+    assert node_modules_dirs == [tmpdir / "1"]
+
+
+def test_find_node_modules_dirs_in_parallel(tmpdir: Path) -> None:
+    FOLDER_COUNT = 20
+
+    for i in range(FOLDER_COUNT):
+        node_modules_dir = tmpdir / str(i) / "nested" / "node_modules"
+        node_modules_dir.mkdir(parents=True, exist_ok=True)
+
+    node_modules_dirs = list(find_node_modules_dirs(tmpdir, jobs=4))
+
+    assert sorted(node_modules_dirs) == sorted(
+        tmpdir / str(i) / "nested" for i in range(FOLDER_COUNT)
+    )
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_find_node_modules_dirs_raises_unexpected_errors(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch, jobs: int
+) -> None:
+    for i in range(10):
+        (tmpdir / str(i) / "node_modules").mkdir(parents=True)
+
+    def broken_last_activity(dir: Path) -> float:
+        raise RuntimeError(f"broken {dir}")
+
+    monkeypatch.setattr(files, "last_activity", broken_last_activity)
+
+    with pytest.raises(RuntimeError):
+        list(find_node_modules_dirs(tmpdir, jobs=jobs))
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_find_node_modules_dirs_skips_folders_it_can_not_read(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch, jobs: int
+) -> None:
+    for i in range(10):
+        (tmpdir / str(i) / "node_modules").mkdir(parents=True)
+
+    last_activity = files.last_activity
+
+    def flaky_last_activity(dir: Path) -> float | None:
+        if dir.name == "3":
+            raise PermissionError(f"can not read {dir}")
+
+        return last_activity(dir)
+
+    monkeypatch.setattr(files, "last_activity", flaky_last_activity)
+
+    assert len(list(find_node_modules_dirs(tmpdir, jobs=jobs))) == 9
+
+    with pytest.raises(PermissionError):
+        list(find_node_modules_dirs(tmpdir, jobs=jobs, raises=True))
+
+
+def test_find_node_modules_dirs_in_parallel_can_stop_early(tmpdir: Path) -> None:
+    for i in range(10):
+        node_modules_dir = tmpdir / str(i) / "node_modules"
+        node_modules_dir.mkdir(parents=True, exist_ok=True)
+
+    node_modules_dirs_iter = find_node_modules_dirs(tmpdir, jobs=4)
+
+    assert next(node_modules_dirs_iter).parent == tmpdir
+
+    node_modules_dirs_iter.close()
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_scan_node_modules_dirs_calculates_sizes(tmpdir: Path, jobs: int) -> None:
+    for i in range(3):
+        node_modules_dir = tmpdir / str(i) / "node_modules"
+        node_modules_dir.mkdir(parents=True, exist_ok=True)
+
+        # file with (i + 1) KB of data
+        file = node_modules_dir / "file.txt"
+        file.write_text("a" * 1024 * (i + 1), encoding="ASCII")
+
+    node_folders = list(scan_node_modules_dirs(tmpdir, jobs=jobs, calculate_sizes=True))
+
+    assert len(node_folders) == 3
+
+    for node_folder in node_folders:
+        i = int(node_folder.path.name)
+        assert node_folder.size_calculated
+        assert node_folder.size == pytest.approx((i + 1) / 1024, 0.0001)
+
+
+def test_scan_node_modules_dirs_does_not_calculate_sizes_by_default(
+    tmpdir: Path,
+) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    node_modules_dir.mkdir(parents=True, exist_ok=True)
+
+    node_folders = list(scan_node_modules_dirs(tmpdir))
+
+    assert len(node_folders) == 1
+    assert node_folders[0].size is None
+
+
 def test_remove_node_modules(tmpdir: Path) -> None:
     node_modules_dir = tmpdir / f"node_modules"
     node_modules_dir.mkdir(parents=True, exist_ok=True)
@@ -321,6 +665,20 @@ def test_calculate_size_dont_follow_symlinks(tmpdir: Path) -> None:
     assert size == pytest.approx(1 / 1024, 0.0001)
 
 
+@pytest.mark.skipif("nt" == os.name, reason="Windows does not support symlinks")
+def test_calculate_size_counts_linked_files_as_links(tmpdir: Path) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    node_modules_dir.mkdir()
+
+    target = tmpdir / "target"
+    target.write_text("a" * 1024 * 1024)
+
+    (node_modules_dir / "link").symlink_to(target)
+    (node_modules_dir / "broken").symlink_to(tmpdir / "missing")
+
+    assert calculate_size(node_modules_dir, raises=True) < 0.01
+
+
 def test_calculate_size_raises_error_on_non_existing_folder(tmpdir: Path) -> None:
     invalid_path = tmpdir / "invalid_path"
     with pytest.raises(FileNotFoundError):
@@ -347,3 +705,149 @@ def test_calculate_size_ignores_windows_junctions(tmpdir: Path) -> None:
     size = calculate_size(node_modules_dir)
 
     assert size == pytest.approx(1 / 1024, 0.0001)
+
+
+@pytest.mark.skipif("nt" == os.name, reason="st_blocks is not available on Windows")
+def test_calculate_size_disk_usage_counts_allocated_blocks(tmpdir: Path) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    node_modules_dir.mkdir(parents=True, exist_ok=True)
+
+    file = node_modules_dir / "file.txt"
+    file.write_text("a", encoding="ASCII")
+
+    size = calculate_size(node_modules_dir, disk_usage=True)
+
+    expected = (node_modules_dir.stat().st_blocks + file.stat().st_blocks) * 512
+    assert size == pytest.approx(expected / 1024 / 1024, 0.0001)
+
+
+@pytest.mark.skipif("nt" == os.name, reason="st_blocks is not available on Windows")
+def test_calculate_size_disk_usage_counts_hardlinks_once(tmpdir: Path) -> None:
+    store = tmpdir / "store"
+    store.mkdir()
+    file = store / "file.txt"
+    file.write_text("a" * 64 * 1024, encoding="ASCII")
+
+    seen_inodes = InodeSet()
+    sizes = []
+
+    for i in range(2):
+        node_modules_dir = tmpdir / str(i) / "node_modules"
+        node_modules_dir.mkdir(parents=True, exist_ok=True)
+        os.link(file, node_modules_dir / "file.txt")
+
+        sizes.append(
+            calculate_size(node_modules_dir, disk_usage=True, seen_inodes=seen_inodes)
+        )
+
+    file_size = file.stat().st_blocks * 512 / 1024 / 1024
+
+    assert sizes[0] >= file_size
+    assert sizes[1] < file_size
+    # only the hardlinked file, not the directories
+    assert len(seen_inodes) == 1
+
+
+def test_inode_set_does_not_store_directories(tmpdir: Path) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    for name in ["a", "b", "c"]:
+        (node_modules_dir / name / "lib").mkdir(parents=True)
+        (node_modules_dir / name / "lib" / "index.js").write_text("a")
+
+    seen_inodes = InodeSet()
+    calculate_size(node_modules_dir, disk_usage=True, seen_inodes=seen_inodes)
+
+    assert len(seen_inodes) == 0
+
+
+def test_inode_set_keeps_every_device_and_inode() -> None:
+    def hardlink(dev: int, ino: int) -> os.stat_result:
+        return os.stat_result((0o100644, ino, dev, 2, 0, 0, 0, 0, 0, 0))
+
+    inodes = [0, 2**64 - 1, 2**127, *range(1, 50_000, 7)]
+
+    seen_inodes = InodeSet()
+
+    # enough inodes to grow the table of each device several times
+    assert all(seen_inodes.add(hardlink(dev, ino)) for dev in (1, 2) for ino in inodes)
+    assert not any(
+        seen_inodes.add(hardlink(dev, ino)) for dev in (1, 2) for ino in inodes
+    )
+    assert len(seen_inodes) == 2 * len(inodes)
+
+
+def test_estimate_size(tmpdir: Path) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+
+    for i in range(ESTIMATE_SAMPLES * 8):
+        package_dir = node_modules_dir / ("@scope" if i % 2 else "") / f"package_{i}"
+        package_dir.mkdir(parents=True)
+        (package_dir / "index.js").write_text("a" * 1024, encoding="ASCII")
+
+    (node_modules_dir / ".package-lock.json").write_text("a" * 1024, encoding="ASCII")
+
+    estimate = estimate_size(node_modules_dir)
+
+    assert estimate == pytest.approx(calculate_size(node_modules_dir), 0.0001)
+
+
+def test_estimate_size_of_small_folder(tmpdir: Path) -> None:
+    package_dir = tmpdir / "node_modules" / "package"
+    package_dir.mkdir(parents=True)
+    (package_dir / "index.js").write_text("a" * 1024, encoding="ASCII")
+
+    assert estimate_size(tmpdir / "node_modules") is None
+
+
+def test_scan_node_modules_dirs_collects_last_activity(tmpdir: Path) -> None:
+    project_dir = tmpdir / "project"
+    (project_dir / "node_modules").mkdir(parents=True)
+    (project_dir / ".git").mkdir()
+
+    for name, mtime in [
+        ("package.json", 1_000_000),
+        ("yarn.lock", 3_000_000),
+        (os.path.join(".git", "HEAD"), 2_000_000),
+    ]:
+        (project_dir / name).write_text("", encoding="utf-8")
+        os.utime(project_dir / name, (mtime, mtime))
+
+    (node_folder,) = scan_node_modules_dirs(tmpdir, ignore_dot=False)
+
+    assert node_folder.last_activity == 3_000_000
+
+
+def test_scan_node_modules_dirs_without_activity_files(tmpdir: Path) -> None:
+    (tmpdir / "project" / "node_modules").mkdir(parents=True)
+
+    (node_folder,) = scan_node_modules_dirs(tmpdir)
+
+    assert node_folder.last_activity is None
+
+
+def test_format_age() -> None:
+    now = 100_000_000
+
+    assert format_age(None) == "?"
+    assert format_age(now - 10, now) == "now"
+    assert format_age(now - 3 * 60 * 60, now) == "3h"
+    assert format_age(now - 45 * 24 * 60 * 60, now) == "1mo"
+    assert format_age(now - 800 * 24 * 60 * 60, now) == "2y"
+
+
+def test_scan_kwargs_from_dialog_settings(tmpdir: Path) -> None:
+    settings = DialogSettings(
+        target_dir=tmpdir, jobs=4, size_during_scan=True, max_depth=2
+    )
+
+    kwargs = scan_kwargs(settings, index=None)
+
+    assert set(kwargs) <= set(inspect.signature(scan_node_modules_dirs).parameters)
+    assert kwargs["jobs"] == 4
+    assert kwargs["max_depth"] == 2
+    assert kwargs["calculate_sizes"]
+    assert "index" in kwargs
+
+    settings.skip_calculating_size = True
+
+    assert not scan_kwargs(settings)["calculate_sizes"]
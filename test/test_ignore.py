@@ -0,0 +1,45 @@
+from npmnuke.ignore import IgnoreMatcher
+
+
+def test_ignore_matcher_matches_names_at_any_depth() -> None:
+    matcher = IgnoreMatcher(["AppData", "*.egg-info"])
+
+    assert matcher.match("AppData", "AppData")
+    assert matcher.match("a/b/AppData", "AppData")
+    assert matcher.match("src/npmnuke.egg-info", "npmnuke.egg-info")
+    assert not matcher.match("src", "src")
+
+
+def test_ignore_matcher_anchors_paths_with_slash() -> None:
+    matcher = IgnoreMatcher(["share/python-wheels", "/build/"])
+
+    assert matcher.match("share/python-wheels", "python-wheels")
+    assert not matcher.match("a/share/python-wheels", "python-wheels")
+    assert matcher.match("build", "build")
+    assert not matcher.match("a/build", "build")
+
+
+def test_ignore_matcher_double_star() -> None:
+    matcher = IgnoreMatcher(["**/cache/tmp", "vendor/**"])
+
+    assert matcher.match("cache/tmp", "tmp")
+    assert matcher.match("a/b/cache/tmp", "tmp")
+    assert matcher.match("vendor/a/b", "b")
+    assert not matcher.match("vendor", "vendor")
+
+
+def test_ignore_matcher_last_pattern_wins() -> None:
+    matcher = IgnoreMatcher(["tmp*", "!tmp-keep", "tmp-keep/old"])
+
+    assert matcher.match("tmp-1", "tmp-1")
+    assert not matcher.match("tmp-keep", "tmp-keep")
+    assert matcher.match("tmp-keep/old", "old")
+
+
+def test_ignore_matcher_skips_comments_and_blank_lines() -> None:
+    matcher = IgnoreMatcher(["# comment", "", "   ", "\\#hash"])
+
+    assert matcher.patterns == ["\\#hash"]
+    assert matcher.match("#hash", "#hash")
+    assert not matcher.match("# comment", "# comment")
+    assert not IgnoreMatcher(["# only a comment"])
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from npmnuke.mounts import DEFAULT_SKIP_FS_TYPES, read_mounts, skipped_mount_points
+
+MOUNTS = [
+    ("/", "ext4"),
+    ("/proc", "proc"),
+    ("/home/user/share", "nfs4"),
+    ("/home/user/my projects", "ext4"),
+    ("/mnt/data", "nfs4"),
+]
+
+
+def test_read_mounts_unescapes_mount_points(tmp_path: Path) -> None:
+    mounts_file = tmp_path / "mounts"
+    mounts_file.write_text(
+        "proc /proc proc rw,nosuid 0 0\n"
+        "/dev/sda2 /home/user/my\\040projects ext4 rw 0 0\n"
+    )
+
+    assert read_mounts(str(mounts_file)) == (
+        ("/proc", "proc"),
+        ("/home/user/my projects", "ext4"),
+    )
+
+
+def test_read_mounts_without_mount_table(tmp_path: Path) -> None:
+    assert read_mounts(str(tmp_path / "missing")) == ()
+
+
+def test_skipped_mount_points_below_target_dir() -> None:
+    assert skipped_mount_points("/", {"proc", "nfs4"}, MOUNTS) == {
+        "/proc",
+        "/home/user/share",
+        "/mnt/data",
+    }
+    assert skipped_mount_points("/home/user", {"proc", "nfs4"}, MOUNTS) == {
+        "/home/user/share"
+    }
+    assert skipped_mount_points("/home/user", (), MOUNTS) == set()
+
+
+def test_skipped_mount_points_later_mount_wins() -> None:
+    mounts = [*MOUNTS, ("/mnt/data", "ext4")]
+
+    assert skipped_mount_points("/mnt", {"nfs4"}, mounts) == set()
+
+
+def test_skipped_mount_points_scans_network_homes_by_default() -> None:
+    mounts = [
+        ("/", "ext4"),
+        ("/proc", "proc"),
+        ("/home", "autofs"),
+        ("/home/alice", "nfs4"),
+        ("/home/bob", "cifs"),
+    ]
+
+    assert skipped_mount_points("/home", DEFAULT_SKIP_FS_TYPES, mounts) == set()
+    assert skipped_mount_points("/", DEFAULT_SKIP_FS_TYPES, mounts) == {"/proc"}
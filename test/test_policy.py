@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from npmnuke.models import CleanupPolicy, DialogSettings
+from npmnuke.policy import unattended_cleanup
+from test.conftest import make_project
+
+
+def test_unattended_cleanup_all(tmpdir: Path) -> None:
+    projects = [make_project(tmpdir, str(i), 1) for i in range(3)]
+
+    summary = unattended_cleanup(
+        DialogSettings(target_dir=tmpdir), CleanupPolicy(select_all=True)
+    )
+
+    assert summary.found == summary.selected == summary.removed == 3
+    assert summary.bytes == 3 * 1024
+    assert not any((project / "node_modules").exists() for project in projects)
+
+
+def test_unattended_cleanup_filters(tmpdir: Path) -> None:
+    small_old = make_project(tmpdir, "small_old", 1, age_days=100)
+    big_new = make_project(tmpdir, "big_new", 100, age_days=1)
+    big_old = make_project(tmpdir, "big_old", 100, age_days=100)
+
+    summary = unattended_cleanup(
+        DialogSettings(target_dir=tmpdir),
+        CleanupPolicy(min_size=50 / 1024, older_than=30),
+    )
+
+    assert summary.found == 3
+    assert summary.removed == 1
+    assert not (big_old / "node_modules").exists()
+    assert (small_old / "node_modules").exists()
+    assert (big_new / "node_modules").exists()
+
+
+def test_unattended_cleanup_stops_at_max_total(tmpdir: Path) -> None:
+    for i in range(5):
+        make_project(tmpdir, str(i), 10)
+
+    summary = unattended_cleanup(
+        DialogSettings(target_dir=tmpdir, size_jobs=1),
+        CleanupPolicy(max_total=25 / 1024),
+    )
+
+    assert summary.budget_reached
+    assert summary.removed == 3
+    assert summary.bytes == 30 * 1024
+    assert len(list(tmpdir.glob("*/node_modules"))) == 2
+
+
+def test_unattended_cleanup_dry_run(tmpdir: Path) -> None:
+    project = make_project(tmpdir, "project", 1)
+
+    summary = unattended_cleanup(
+        DialogSettings(target_dir=tmpdir, dry_run=True),
+        CleanupPolicy(select_all=True),
+    )
+
+    assert summary.selected == 1
+    assert summary.removed == 0
+    assert summary.bytes == 1024
+    assert (project / "node_modules").exists()
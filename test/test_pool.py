@@ -0,0 +1,189 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from npmnuke import pool as pool_module
+from npmnuke.pool import PRIORITY_HIGHLIGHTED, SizePool
+from test.conftest import make_project
+
+
+def test_size_pool_map_keeps_order(tmpdir: Path) -> None:
+    projects = [make_project(tmpdir, str(i), i + 1) for i in range(5)]
+
+    with SizePool(jobs=3) as pool:
+        sizes = list(pool.map(projects))
+
+    assert sizes == [pytest.approx((i + 1) / 1024, 0.0001) for i in range(5)]
+
+
+def test_size_pool_submit_same_path_twice(tmpdir: Path) -> None:
+    project = make_project(tmpdir, "project", 1)
+
+    with SizePool(jobs=1) as pool:
+        first = pool.submit(project)
+        second = pool.submit(project)
+
+        assert first is second
+        assert first.result() == pytest.approx(1 / 1024, 0.0001)
+
+
+def test_size_pool_calculates_prioritized_folders_first(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    blocker = make_project(tmpdir, "blocker", 1)
+    projects = [make_project(tmpdir, str(i), 1) for i in range(5)]
+
+    started = threading.Event()
+    release = threading.Event()
+    order: list[Path] = []
+
+    def calculate_size(dir: Path, **kwargs) -> float:
+        if dir.parent == blocker:
+            started.set()
+            release.wait()
+
+        order.append(dir.parent)
+        return 0.0
+
+    monkeypatch.setattr(pool_module, "calculate_size", calculate_size)
+
+    with SizePool(jobs=1) as pool:
+        pool.submit(blocker)
+        started.wait()
+
+        futures = [pool.submit(project) for project in projects]
+        pool.prioritize(projects[3], PRIORITY_HIGHLIGHTED)
+
+        release.set()
+
+        for future in futures:
+            future.result()
+
+    assert order == [blocker, projects[3], *projects[:3], projects[4]]
+
+
+def test_size_pool_shutdown_cancels_waiting_folders(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    blocker = make_project(tmpdir, "blocker", 1)
+    project = make_project(tmpdir, "project", 1)
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def calculate_size(dir: Path, **kwargs) -> float:
+        started.set()
+        release.wait()
+        return 0.0
+
+    monkeypatch.setattr(pool_module, "calculate_size", calculate_size)
+
+    pool = SizePool(jobs=1)
+    pool.submit(blocker)
+    started.wait()
+
+    future = pool.submit(project)
+    pool.shutdown(wait=False)
+    release.set()
+
+    assert future.cancelled()
+
+
+def test_size_pool_entries_order(tmpdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    blocker = make_project(tmpdir, "blocker", 1)
+    projects = [make_project(tmpdir, str(i), 1) for i in range(3)]
+
+    # more packages in the later projects
+    for i, project in enumerate(projects):
+        for j in range(i):
+            (project / "node_modules" / f"package_{j}").mkdir()
+
+    started = threading.Event()
+    release = threading.Event()
+    order: list[Path] = []
+
+    def calculate_size(dir: Path, **kwargs) -> float:
+        if dir.parent == blocker:
+            started.set()
+            release.wait()
+
+        order.append(dir.parent)
+        return 0.0
+
+    monkeypatch.setattr(pool_module, "calculate_size", calculate_size)
+
+    with SizePool(jobs=1, size_order="entries") as pool:
+        pool.submit(blocker)
+        started.wait()
+
+        futures = [pool.submit(project) for project in projects]
+
+        release.set()
+
+        for future in futures:
+            future.result()
+
+    assert order == [blocker, *reversed(projects)]
+
+
+def test_size_pool_counts_entries_without_holding_the_lock(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    project = make_project(tmpdir, "project", 1)
+    locked: list[bool] = []
+
+    with SizePool(jobs=1, size_order="entries") as pool:
+        count_entries = pool_module.count_entries
+
+        def checking_count_entries(dir: Path) -> int:
+            # tried from another thread, the lock of the pool is reentrant
+            def try_lock() -> None:
+                acquired = pool._condition.acquire(blocking=False)
+                locked.append(not acquired)
+                if acquired:
+                    pool._condition.release()
+
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+
+            return count_entries(dir)
+
+        monkeypatch.setattr(pool_module, "count_entries", checking_count_entries)
+
+        pool.submit(project).result()
+
+    assert locked == [False]
+
+
+def test_size_pool_estimates_while_exact_sizes_are_calculated(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    project = make_project(tmpdir, "project", 1)
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def calculate_size(dir: Path, **kwargs) -> float:
+        started.set()
+        release.wait()
+        return 2.0
+
+    monkeypatch.setattr(pool_module, "calculate_size", calculate_size)
+    monkeypatch.setattr(pool_module, "estimate_size", lambda dir, **kwargs: 1.0)
+
+    with SizePool(jobs=1) as pool:
+        exact = pool.submit(project)
+        started.wait()
+
+        try:
+            # the only size worker is busy with the exact size
+            estimate = pool.estimate(project).result(timeout=5)
+            calculating = not exact.done()
+        finally:
+            release.set()
+
+    assert estimate == 1.0
+    assert calculating
+    assert exact.result() == 2.0
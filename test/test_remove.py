@@ -0,0 +1,129 @@
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from npmnuke.models import RemoveProgress
+from npmnuke.remove import ProgressTotal, remove_tree
+
+
+def make_tree(root: Path, depth: int, width: int) -> int:
+    """
+    Create a tree of 1 KB files and return the number of files.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    files = 0
+
+    for i in range(width):
+        (root / f"file_{i}.txt").write_text("a" * 1024, encoding="ASCII")
+        files += 1
+
+        if depth > 0:
+            files += make_tree(root / f"dir_{i}", depth - 1, width)
+
+    return files
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_remove_tree(tmpdir: Path, jobs: int) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    files = make_tree(node_modules_dir, depth=3, width=4)
+
+    progress = remove_tree(str(node_modules_dir), jobs=jobs)
+
+    assert not node_modules_dir.exists()
+
+    if "nt" != os.name:
+        assert progress.files == files
+        assert progress.bytes == files * 1024
+
+
+@pytest.mark.skipif("nt" == os.name, reason="Progress is not reported on Windows")
+def test_remove_tree_reports_progress(tmpdir: Path) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    files = make_tree(node_modules_dir, depth=2, width=3)
+
+    reported = [0, 0]
+
+    def on_progress(removed_files: int, removed_bytes: int) -> None:
+        reported[0] += removed_files
+        reported[1] += removed_bytes
+
+    remove_tree(str(node_modules_dir), jobs=2, on_progress=on_progress)
+
+    assert reported == [files, files * 1024]
+
+
+@pytest.mark.skipif("nt" == os.name, reason="Windows does not support symlinks")
+@pytest.mark.skipif("nt" == os.name, reason="No progress without directory fds")
+def test_remove_tree_reports_progress_total(tmpdir: Path) -> None:
+    files = make_tree(tmpdir / "tree", depth=2, width=4)
+    reports: list[RemoveProgress] = []
+
+    total = ProgressTotal(reports.append, interval=0)
+    remove_tree(str(tmpdir / "tree"), jobs=4, on_progress=total)
+
+    assert total.progress == RemoveProgress(files, files * 1024)
+    assert reports[-1] == total.progress
+    assert [report.files for report in reports] == sorted(
+        report.files for report in reports
+    )
+
+
+def test_progress_total_reports_at_most_every_interval() -> None:
+    reports: list[RemoveProgress] = []
+
+    total = ProgressTotal(reports.append, interval=3600)
+    for _ in range(5):
+        total(1, 1024)
+
+    assert reports == [RemoveProgress(1, 1024)]
+    assert total.progress == RemoveProgress(5, 5 * 1024)
+
+
+def test_remove_tree_does_not_follow_symlinks(tmpdir: Path) -> None:
+    node_modules_dir = tmpdir / "node_modules"
+    make_tree(node_modules_dir, depth=1, width=2)
+
+    outside_dir = tmpdir / "outside"
+    make_tree(outside_dir, depth=1, width=2)
+
+    (node_modules_dir / "dir_0" / "link").symlink_to(outside_dir)
+
+    remove_tree(str(node_modules_dir), jobs=4)
+
+    assert not node_modules_dir.exists()
+    assert (outside_dir / "dir_1" / "file_1.txt").exists()
+
+
+def test_remove_tree_raises_on_missing_folder(tmpdir: Path) -> None:
+    with pytest.raises(FileNotFoundError):
+        remove_tree(str(tmpdir / "missing"), jobs=2)
+
+
+@pytest.mark.skipif("nt" == os.name, reason="Removed with shutil.rmtree")
+def test_remove_tree_twice_at_the_same_time(tmpdir: Path) -> None:
+    for trial in range(10):
+        node_modules_dir = tmpdir / str(trial) / "node_modules"
+        make_tree(node_modules_dir, depth=3, width=5)
+
+        errors: list[OSError] = []
+
+        def remove() -> None:
+            try:
+                remove_tree(str(node_modules_dir), jobs=4)
+            except FileNotFoundError:
+                # the other removal was already done with it
+                pass
+            except OSError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=remove) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert not node_modules_dir.exists()
@@ -0,0 +1,181 @@
+import asyncio
+import typing
+from pathlib import Path
+
+import pytest
+from textual.pilot import Pilot
+
+from npmnuke.app import NPMNuke
+from npmnuke.models import DialogSettings
+from test.conftest import make_project
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmpdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # keep the tombstone registry of the app out of the real cache
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir / "cache"))
+
+
+async def wait_for(
+    pilot: Pilot, condition: typing.Callable[[], bool], timeout: float = 5.0
+) -> None:
+    """
+    Let the app run until `condition` holds.
+    """
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+
+        await pilot.pause(0.05)
+
+    assert condition()
+
+
+def run_app(settings: DialogSettings, test) -> None:
+    async def run() -> None:
+        app = NPMNuke(settings)
+
+        async with app.run_test(size=(80, 12)) as pilot:
+            await test(app, pilot)
+
+    asyncio.run(run())
+
+
+def test_results_list_appends_rows(tmpdir: Path) -> None:
+    projects = {make_project(tmpdir, str(i)) for i in range(20)}
+
+    async def test(app: NPMNuke, pilot: Pilot) -> None:
+        results = app._node_results
+        await wait_for(pilot, lambda: len(results._rows) == 20)
+
+        assert {node_folder.path for node_folder in results._rows} == projects
+        assert results._row_index == {
+            node_folder.path: row for row, node_folder in enumerate(results._rows)
+        }
+        assert results.virtual_size.height == 20
+        assert str(results._rows[0].path) in results.render_line(0).text
+
+    run_app(DialogSettings(target_dir=tmpdir, skip_calculating_size=True), test)
+
+
+def test_results_list_updates_sizes(tmpdir: Path) -> None:
+    for i in range(5):
+        make_project(tmpdir, str(i), size_kb=i + 1)
+
+    async def test(app: NPMNuke, pilot: Pilot) -> None:
+        results = app._node_results
+        await wait_for(
+            pilot,
+            lambda: len(results._rows) == 5
+            and all(node_folder.size_calculated for node_folder in results._rows),
+        )
+
+        for node_folder in results._rows:
+            size_kb = int(node_folder.path.name) + 1
+            assert node_folder.size == pytest.approx(size_kb / 1024, 0.0001)
+
+        assert results._pending_sizes == 0
+        assert "0.00 MB" in results.render_line(0).text
+
+    run_app(DialogSettings(target_dir=tmpdir), test)
+
+
+def test_results_list_moves_cursor(tmpdir: Path) -> None:
+    for i in range(20):
+        make_project(tmpdir, str(i))
+
+    async def test(app: NPMNuke, pilot: Pilot) -> None:
+        results = app._node_results
+        await wait_for(pilot, lambda: len(results._rows) == 20)
+
+        assert results.index == 0
+
+        await pilot.press("down", "down")
+        assert results.index == 2
+        assert results.highlighted is results._rows[2]
+
+        await pilot.press("up")
+        assert results.index == 1
+
+        await pilot.press("end")
+        assert results.index == 19
+        # the view follows the cursor
+        assert results.scroll_offset.y > 0
+
+        await pilot.press("down")
+        assert results.index == 19
+
+        await pilot.press("home")
+        assert results.index == 0
+
+    run_app(DialogSettings(target_dir=tmpdir, skip_calculating_size=True), test)
+
+
+def test_results_list_marks_removed_rows(tmpdir: Path) -> None:
+    projects = [make_project(tmpdir, str(i)) for i in range(3)]
+
+    async def test(app: NPMNuke, pilot: Pilot) -> None:
+        results = app._node_results
+        await wait_for(
+            pilot,
+            lambda: len(results._rows) == 3
+            and all(node_folder.size is not None for node_folder in results._rows),
+        )
+
+        await pilot.press("down", "space")
+        removed = results._rows[1]
+        await wait_for(pilot, lambda: removed.removed)
+
+        assert not (removed.path / "node_modules").exists()
+        assert not results._removed_bytes
+        assert [node_folder.removed for node_folder in results._rows] == [
+            False,
+            True,
+            False,
+        ]
+
+    run_app(DialogSettings(target_dir=tmpdir), test)
+
+    assert sum((project / "node_modules").exists() for project in projects) == 2
+
+
+def test_results_list_keeps_largest_rows_with_top(tmpdir: Path) -> None:
+    for i in range(6):
+        make_project(tmpdir, str(i), size_kb=i + 1)
+
+    async def test(app: NPMNuke, pilot: Pilot) -> None:
+        results = app._node_results
+        await wait_for(
+            pilot,
+            lambda: [node_folder.path.name for node_folder in results._rows]
+            == ["5", "4", "3"],
+        )
+
+        assert set(results.node_results) == {
+            node_folder.path for node_folder in results._rows
+        }
+        assert results._row_index == {
+            node_folder.path: row for row, node_folder in enumerate(results._rows)
+        }
+
+    run_app(DialogSettings(target_dir=tmpdir, top=3), test)
+
+
+@pytest.mark.parametrize("top", [None, 3])
+def test_results_list_shows_cached_sizes(tmpdir: Path, top: int | None) -> None:
+    for i in range(3):
+        make_project(tmpdir, str(i), size_kb=i + 1)
+
+    async def test(app: NPMNuke, pilot: Pilot) -> None:
+        results = app._node_results
+        await wait_for(
+            pilot,
+            lambda: len(results._rows) == 3
+            and all(node_folder.size_calculated for node_folder in results._rows),
+        )
+
+    settings = DialogSettings(target_dir=tmpdir, size_cache=True, top=top)
+
+    # the second run takes every size from the cache
+    run_app(settings, test)
+    run_app(settings, test)
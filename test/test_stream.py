@@ -0,0 +1,47 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from npmnuke.models import DialogSettings
+from npmnuke.stream import ndjson_dialog
+from test.conftest import make_project
+
+
+@pytest.mark.parametrize("size_during_scan", [False, True])
+def test_ndjson_dialog_writes_one_record_per_folder(
+    tmpdir: Path, size_during_scan: bool
+) -> None:
+    projects = {make_project(tmpdir, str(i), i + 1): i + 1 for i in range(10)}
+
+    out = io.StringIO()
+    ndjson_dialog(
+        DialogSettings(
+            target_dir=tmpdir, size_jobs=1, size_during_scan=size_during_scan
+        ),
+        out=out,
+    )
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    assert len(records) == len(projects)
+    for record in records:
+        size_kb = projects[Path(record["path"])]
+        assert record["size"] == pytest.approx(size_kb / 1024, 0.0001)
+        assert 0 <= record["found"] <= record["sized"]
+
+
+def test_ndjson_dialog_without_sizes(tmpdir: Path) -> None:
+    make_project(tmpdir, "project", 1)
+
+    out = io.StringIO()
+    ndjson_dialog(
+        DialogSettings(target_dir=tmpdir, skip_calculating_size=True), out=out
+    )
+
+    (record,) = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    assert record["path"] == str(tmpdir / "project")
+    assert record["size"] is None
+    assert record["sized"] is None
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pytest
+
+from npmnuke import tombstone as tombstone_module
+from npmnuke.files import find_node_modules_dirs
+from npmnuke.tombstone import TOMBSTONE_PREFIX, Reaper, bury
+
+
+def make_node_modules(tmpdir: Path) -> Path:
+    node_modules_dir = tmpdir / "project" / "node_modules"
+    (node_modules_dir / "package" / "node_modules").mkdir(parents=True)
+    (node_modules_dir / "package" / "index.js").write_text("", encoding="utf-8")
+
+    return node_modules_dir
+
+
+def test_bury_moves_folder_next_to_it(tmpdir: Path) -> None:
+    node_modules_dir = make_node_modules(tmpdir)
+
+    tombstone = bury(node_modules_dir, registry=tmpdir / "tombstones")
+
+    assert not node_modules_dir.exists()
+    assert tombstone.parent == node_modules_dir.parent
+    assert tombstone.name.startswith(TOMBSTONE_PREFIX)
+    assert (tombstone / "package" / "index.js").exists()
+
+
+def test_reaper_removes_buried_folder(tmpdir: Path) -> None:
+    node_modules_dir = make_node_modules(tmpdir)
+
+    reaper = Reaper(registry=tmpdir / "tombstones")
+    tombstone = reaper.bury(node_modules_dir)
+    reaper.wait()
+
+    assert not node_modules_dir.exists()
+    assert not tombstone.exists()
+    assert reaper.pending == 0
+
+
+def test_reaper_resumes_tombstones_of_earlier_runs(tmpdir: Path) -> None:
+    node_modules_dir = make_node_modules(tmpdir)
+    tombstone = bury(node_modules_dir, registry=tmpdir / "tombstones")
+
+    reaper = Reaper(registry=tmpdir / "tombstones")
+
+    assert reaper.resume() == 1
+
+    reaper.wait()
+
+    assert not tombstone.exists()
+    assert (tmpdir / "tombstones").read_text(encoding="utf-8") == f"{tombstone}\n"
+
+    assert Reaper(registry=tmpdir / "tombstones").resume() == 0
+    assert (tmpdir / "tombstones").read_text(encoding="utf-8") == ""
+
+
+def test_reaper_context_resumes_tombstones_of_earlier_runs(tmpdir: Path) -> None:
+    tombstone = bury(make_node_modules(tmpdir), registry=tmpdir / "tombstones")
+
+    with Reaper(registry=tmpdir / "tombstones") as reaper:
+        reaper.wait()
+
+    assert not tombstone.exists()
+
+
+def test_reaper_resume_keeps_tombstones_buried_meanwhile(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    registry = tmpdir / "tombstones"
+    tombstone = bury(make_node_modules(tmpdir), registry=registry)
+
+    other_node_modules_dir = tmpdir / "other" / "node_modules"
+    other_node_modules_dir.mkdir(parents=True)
+    buried: list[Path] = []
+
+    read_registry = tombstone_module._read_registry
+
+    def burying_read_registry(path: Path) -> list[Path]:
+        # another process buries a folder while the registry is read
+        buried.append(bury(other_node_modules_dir, registry=registry))
+        return read_registry(path)
+
+    monkeypatch.setattr(tombstone_module, "_read_registry", burying_read_registry)
+
+    reaper = Reaper(registry=registry)
+
+    assert reaper.resume() == 1
+
+    reaper.wait()
+
+    assert registry.read_text(encoding="utf-8").splitlines() == [
+        str(buried[0]),
+        str(tombstone),
+    ]
+    assert list(tmpdir.glob("tombstones.*")) == []
+
+
+def test_find_node_modules_dirs_skips_tombstones(tmpdir: Path) -> None:
+    node_modules_dir = make_node_modules(tmpdir)
+    bury(node_modules_dir, registry=tmpdir / "tombstones")
+
+    assert list(find_node_modules_dirs(tmpdir, ignore_dot=False)) == []
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from npmnuke.models import NodeFolder
+from npmnuke.top import TopFolders
+
+
+def test_top_folders_keeps_largest() -> None:
+    top = TopFolders(3)
+    sizes = [5.0, 1.0, 9.0, 3.0, 7.0, 2.0]
+
+    for i, size in enumerate(sizes):
+        top.push(NodeFolder(Path(str(i)), size))
+
+    assert len(top) == 3
+    assert [node_folder.size for node_folder in top.folders()] == [9.0, 7.0, 5.0]
+
+
+def test_top_folders_reports_dropped_folder() -> None:
+    top = TopFolders(2)
+    small = NodeFolder(Path("small"), 1.0)
+    big = NodeFolder(Path("big"), 5.0)
+
+    assert top.push(small) == (True, None)
+    assert top.push(big) == (True, None)
+    assert top.push(NodeFolder(Path("smaller"), 0.5)) == (False, None)
+
+    bigger = NodeFolder(Path("bigger"), 10.0)
+    assert top.push(bigger) == (True, small)
+    assert top.folders() == [bigger, big]
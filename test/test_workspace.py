@@ -0,0 +1,167 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from npmnuke.files import (
+    find_node_modules_dirs,
+    remove_node_modules,
+    scan_node_modules_dirs,
+)
+from npmnuke import workspace
+from npmnuke.workspace import workspace_members, workspace_patterns
+
+
+def make_package(dir: Path, size_kb: int = 1) -> None:
+    (dir / "node_modules").mkdir(parents=True, exist_ok=True)
+    (dir / "node_modules" / "file.txt").write_text(
+        "a" * 1024 * size_kb, encoding="ASCII"
+    )
+
+
+def make_workspace(tmpdir: Path) -> Path:
+    root = tmpdir / "monorepo"
+    make_package(root, 4)
+    (root / "package.json").write_text(
+        json.dumps({"workspaces": ["packages/*", "!packages/skipped"]}),
+        encoding="utf-8",
+    )
+
+    for name in ["a", "b", "skipped"]:
+        make_package(root / "packages" / name, 2)
+        (root / "packages" / name / "package.json").write_text("{}")
+
+    # a member without an install of its own
+    (root / "packages" / "c").mkdir()
+    (root / "packages" / "c" / "package.json").write_text("{}")
+
+    # not a package
+    (root / "packages" / "docs").mkdir()
+
+    return root
+
+
+def test_workspace_patterns_of_pnpm_workspace(tmpdir: Path) -> None:
+    (tmpdir / "pnpm-workspace.yaml").write_text(
+        "packages:\n"
+        "  # all packages\n"
+        "  - 'packages/*'\n"
+        '  - "apps/**"\n'
+        "  - '!**/test/**'\n"
+        "catalog:\n"
+        "  react: ^18\n",
+        encoding="utf-8",
+    )
+
+    assert workspace_patterns(str(tmpdir)) == (
+        "packages/*",
+        "apps/**",
+        "!**/test/**",
+    )
+
+
+def test_workspace_members(tmpdir: Path) -> None:
+    root = make_workspace(tmpdir)
+
+    assert workspace_members(str(root)) == [
+        str(root / "packages" / name) for name in ["a", "b", "c"]
+    ]
+
+
+def test_workspace_members_of_plain_project(tmpdir: Path) -> None:
+    (tmpdir / "package.json").write_text('{"name": "project"}', encoding="utf-8")
+
+    assert workspace_members(str(tmpdir)) == []
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_scan_node_modules_dirs_groups_workspaces(tmpdir: Path, jobs: int) -> None:
+    root = make_workspace(tmpdir)
+    make_package(tmpdir / "other")
+
+    node_folders = sorted(
+        scan_node_modules_dirs(
+            tmpdir, jobs=jobs, calculate_sizes=True, workspaces=True
+        ),
+        key=lambda node_folder: node_folder.path,
+    )
+
+    assert [node_folder.path for node_folder in node_folders] == [
+        root,
+        root / "packages" / "skipped",
+        tmpdir / "other",
+    ]
+    assert node_folders[0].members == [
+        root / "packages" / "a",
+        root / "packages" / "b",
+    ]
+    assert node_folders[0].size == pytest.approx(8 / 1024, 0.0001)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_scan_node_modules_dirs_groups_workspaces_of_relative_path(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch, jobs: int
+) -> None:
+    make_workspace(tmpdir)
+    monkeypatch.chdir(tmpdir)
+
+    node_folders = list(scan_node_modules_dirs(Path("."), jobs=jobs, workspaces=True))
+
+    assert sorted(str(node_folder.path) for node_folder in node_folders) == [
+        "monorepo",
+        str(Path("monorepo") / "packages" / "skipped"),
+    ]
+
+
+def test_workspace_members_does_not_read_node_modules(
+    tmpdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    root = make_workspace(tmpdir)
+    (root / "package.json").write_text('{"workspaces": ["packages/**"]}')
+    (root / "packages" / "a" / "node_modules" / "dep" / "lib").mkdir(parents=True)
+    (root / "packages" / "a" / "src").mkdir()
+
+    scanned: list[str] = []
+    scandir = os.scandir
+
+    def tracing_scandir(path):
+        scanned.append(str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(workspace.os, "scandir", tracing_scandir)
+
+    assert workspace_members(str(root)) == [
+        str(root / "packages" / name) for name in ["a", "b", "c", "skipped"]
+    ]
+    assert not [path for path in scanned if "node_modules" in path]
+
+
+def test_workspace_patterns_of_invalid_pnpm_workspace(tmpdir: Path) -> None:
+    (tmpdir / "pnpm-workspace.yaml").write_bytes(b"packages:\n  - '\xff'\n")
+
+    assert workspace_patterns(str(tmpdir)) == ()
+
+
+def test_find_node_modules_dirs_does_not_group_workspaces(tmpdir: Path) -> None:
+    make_workspace(tmpdir)
+
+    assert len(list(find_node_modules_dirs(tmpdir))) == 4
+
+
+def test_remove_node_modules_of_workspace(tmpdir: Path) -> None:
+    root = make_workspace(tmpdir)
+
+    (node_folder,) = [
+        node_folder
+        for node_folder in scan_node_modules_dirs(tmpdir, workspaces=True)
+        if node_folder.members
+    ]
+
+    progress = remove_node_modules(root, members=node_folder.members)
+
+    assert progress.bytes == 8 * 1024
+    assert not (root / "node_modules").exists()
+    assert not (root / "packages" / "a" / "node_modules").exists()
+    assert not (root / "packages" / "b" / "node_modules").exists()
+    assert (root / "packages" / "skipped" / "node_modules").exists()